@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import UserProfile, Friendship, BreathingSession, SessionStats
+from .models import (
+    UserProfile, Friendship, BreathingSession, SessionRound, SessionStats, DailySessionRollup,
+    FeedEntry, LeaderboardScore, RefreshTokenRecord
+)
 
 
 @admin.register(UserProfile)
@@ -23,6 +26,11 @@ class SessionStatsInline(admin.StackedInline):
     extra = 0
 
 
+class SessionRoundInline(admin.TabularInline):
+    model = SessionRound
+    extra = 0
+
+
 @admin.register(BreathingSession)
 class BreathingSessionAdmin(admin.ModelAdmin):
     list_display = [
@@ -35,7 +43,7 @@ class BreathingSessionAdmin(admin.ModelAdmin):
         'started_at', 'completed_at', 'actual_duration', 
         'planned_duration', 'duration_formatted'
     ]
-    inlines = [SessionStatsInline]
+    inlines = [SessionRoundInline, SessionStatsInline]
 
     def duration_formatted(self, obj):
         return obj.duration_formatted
@@ -49,4 +57,39 @@ class SessionStatsAdmin(admin.ModelAdmin):
         'stress_level_after', 'mood_before', 'mood_after'
     ]
     list_filter = ['mood_before', 'mood_after']
-    search_fields = ['session__user__username']
\ No newline at end of file
+    search_fields = ['session__user__username']
+
+
+@admin.register(DailySessionRollup)
+class DailySessionRollupAdmin(admin.ModelAdmin):
+    list_display = [
+        'user', 'day', 'session_count', 'breathing_time',
+        'hold_count', 'best_hold_seconds'
+    ]
+    list_filter = ['day']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'actor', 'session', 'completed_at', 'total_hold_seconds']
+    list_filter = ['completed_at']
+    search_fields = ['owner__username', 'actor__username']
+    raw_id_fields = ['owner', 'actor', 'session']
+
+
+@admin.register(LeaderboardScore)
+class LeaderboardScoreAdmin(admin.ModelAdmin):
+    list_display = ['user', 'period', 'session_count', 'breathing_time', 'best_hold_seconds']
+    list_filter = ['period']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(RefreshTokenRecord)
+class RefreshTokenRecordAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'user', 'expires_at', 'revoked_at']
+    list_filter = ['expires_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import exceptions
+
+from .authentication import StatelessJWTAuthentication
+from .cache import cache_metrics
+from .search import search_users
+from .serializers import UserSearchSerializer, BreathingSessionSerializer
+from .views import (
+    accepted_friendships, active_session, recent_sessions_data, serialize_friends,
+    session_stats_data
+)
+
+# Os métodos assíncronos do ORM (aget, acount...) usam sync_to_async com
+# thread_sensitive=True, que executa todas as queries do processo em uma única
+# thread. As leituras aqui usam um pool próprio, para que várias requisições
+# esperem o banco ao mesmo tempo.
+_db_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'BREATHING_ASYNC_DB_THREADS', 16),
+    thread_name_prefix='breathing-db'
+)
+
+
+def _closing_connections(func):
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+async def db_read(func, *args, **kwargs):
+    """Executa uma leitura síncrona (ORM + serializers) no pool de threads do banco"""
+    return await sync_to_async(
+        _closing_connections(func), thread_sensitive=False, executor=_db_executor
+    )(*args, **kwargs)
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+class AsyncAPIView(View):
+    """Base para as views assíncronas somente leitura (servidas por core/asgi.py)"""
+    authentication_required = True
+    jwt_authentication = StatelessJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.authentication_required:
+            try:
+                request.user = await self.authenticate(request)
+            except exceptions.APIException as error:
+                return _json({'detail': str(error.detail)}, status=error.status_code)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def authenticate(self, request):
+        header = self.jwt_authentication.get_header(request)
+        raw_token = self.jwt_authentication.get_raw_token(header) if header else None
+        if raw_token is None:
+            raise exceptions.NotAuthenticated()
+        token = self.jwt_authentication.get_validated_token(raw_token)
+        return self.jwt_authentication.get_user(token)
+
+
+class AsyncSessionStatsView(AsyncAPIView):
+    """Versão assíncrona de /sessions/stats/"""
+
+    async def get(self, request):
+        return _json(await db_read(session_stats_data, request.user))
+
+
+class AsyncRecentSessionsView(AsyncAPIView):
+    """Versão assíncrona de /sessions/recent/"""
+
+    async def get(self, request):
+        return _json(await db_read(recent_sessions_data, request.user.id))
+
+
+class AsyncActiveSessionView(AsyncAPIView):
+    """Versão assíncrona de /sessions/active/"""
+
+    async def get(self, request):
+        def active():
+            session = active_session(request.user.id)
+            return BreathingSessionSerializer(session).data if session else None
+
+        data = await db_read(active)
+        if data is None:
+            return _json({'message': 'Nenhuma sessão ativa'}, status=404)
+        return _json(data)
+
+
+class AsyncFriendsView(AsyncAPIView):
+    """Versão assíncrona de /friendships/friends/"""
+
+    async def get(self, request):
+        user_id = request.user.id
+        return _json(await db_read(lambda: serialize_friends(user_id, accepted_friendships(user_id))))
+
+
+class AsyncUserSearchView(AsyncAPIView):
+    """Versão assíncrona de /users/search/"""
+
+    async def get(self, request):
+        query = request.GET.get('q', '')
+
+        def search():
+            users, relationships = search_users(request.user, query)
+            return UserSearchSerializer(
+                users, many=True, context={'relationships': relationships}
+            ).data
+
+        results = await db_read(search)
+        return _json({'count': len(results), 'next': None, 'previous': None, 'results': results})
+
+
+class AsyncHealthCheckView(AsyncAPIView):
+    """Versão assíncrona de /health/"""
+    authentication_required = False
+
+    async def get(self, request):
+        return _json({
+            'status': 'ok',
+            'timestamp': timezone.now().isoformat(),
+            'message': 'Breathing App API está funcionando!',
+            'cache': cache_metrics()
+        })
@@ -0,0 +1,112 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework import exceptions, status
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .metrics import increment, observe
+from .models import RefreshTokenRecord
+
+
+class BreathingRefreshToken(RefreshToken):
+    """Refresh token com username e is_active nas claims (copiadas para o access token).
+
+    Cada token emitido é registrado em RefreshTokenRecord e vale para uma
+    única rotação em /api/auth/refresh/.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_active'] = user.is_active
+        RefreshTokenRecord.record(token, user.pk)
+        return token
+
+
+class BreathingTokenUser(TokenUser):
+    """Usuário montado a partir das claims do token, sem consultar auth_user"""
+
+    @cached_property
+    def id(self):
+        # A claim é gravada como string; as views comparam com ids inteiros
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def is_active(self):
+        # Tokens emitidos antes da claim existir eram de usuários ativos
+        return self.token.get('is_active', True)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """Autenticação padrão: confia nas claims assinadas do access token.
+
+    Views que precisam do modelo User completo declaram
+    authentication_classes = [JWTAuthentication].
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        try:
+            user.id
+        except (TypeError, ValueError):
+            raise AuthenticationFailed('Token com identificação de usuário inválida', code='bad_user_id')
+        if not user.is_active:
+            raise AuthenticationFailed('Usuário inativo', code='user_inactive')
+        return user
+
+
+class LoginOverloaded(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Muitos logins em andamento. Tente novamente em instantes.'
+    default_code = 'login_overloaded'
+    wait = 1  # segundos (cabeçalho Retry-After)
+
+
+class PasswordCheckLimiter:
+    """Limita as verificações de senha simultâneas do processo.
+
+    O hash da senha ocupa a CPU por dezenas de milissegundos: sem limite, uma
+    rajada de logins disputa a CPU com o resto do tráfego. Além das vagas em
+    execução há uma fila pequena com espera curta (timeout, em segundos), para
+    não prender as threads do servidor; quem não consegue vaga recebe 503 na hora.
+    """
+
+    def __init__(self, slots, queue, timeout):
+        self.running = threading.BoundedSemaphore(slots)
+        self.admitted = threading.BoundedSemaphore(slots + queue)
+        self.timeout = timeout
+
+    @contextmanager
+    def slot(self, view):
+        if not self.admitted.acquire(blocking=False):
+            increment('breathing_login_rejected_total', view)
+            raise LoginOverloaded()
+        try:
+            queued = time.perf_counter()
+            if not self.running.acquire(timeout=self.timeout):
+                increment('breathing_login_rejected_total', view)
+                raise LoginOverloaded()
+            started = time.perf_counter()
+            observe('breathing_login_queue_seconds', view, started - queued)
+            try:
+                yield
+            finally:
+                self.running.release()
+                observe('breathing_login_check_seconds', view, time.perf_counter() - started)
+        finally:
+            self.admitted.release()
+
+
+password_check_limiter = PasswordCheckLimiter(
+    slots=getattr(settings, 'BREATHING_LOGIN_CONCURRENCY', 4),
+    queue=getattr(settings, 'BREATHING_LOGIN_QUEUE', 4),
+    timeout=getattr(settings, 'BREATHING_LOGIN_QUEUE_TIMEOUT', 0.25),
+)
@@ -0,0 +1,57 @@
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Respostas cacheadas por usuário (nome -> endpoint)
+STATS = 'stats'
+RECENT = 'recent'
+ALL_RESPONSES = (STATS, RECENT)
+# Relações de amizade do usuário (Friendship.graph), invalidadas à parte
+FRIEND_GRAPH = 'friend_graph'
+
+_metrics_lock = threading.Lock()
+_metrics = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def get_cache():
+    """Retorna o backend de cache configurado para as respostas por usuário"""
+    return caches[getattr(settings, 'BREATHING_CACHE_ALIAS', 'default')]
+
+
+def _key(name, user_id):
+    return f'breathing:{name}:{user_id}'
+
+
+def _record(name, outcome):
+    with _metrics_lock:
+        _metrics[name][outcome] += 1
+
+
+def cached_user_response(name, user_id, compute):
+    """Retorna os dados cacheados do usuário ou calcula e armazena"""
+    cache = get_cache()
+    key = _key(name, user_id)
+    data = cache.get(key)
+    if data is not None:
+        _record(name, 'hits')
+        return data
+
+    _record(name, 'misses')
+    data = compute()
+    cache.set(key, data, getattr(settings, 'BREATHING_CACHE_TIMEOUT', 300))
+    return data
+
+
+def invalidate_user_responses(user_id, *names):
+    """Remove as respostas cacheadas do usuário após o commit da transação atual"""
+    keys = [_key(name, user_id) for name in (names or ALL_RESPONSES)]
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def cache_metrics():
+    """Retorna uma cópia dos contadores de acertos e falhas por resposta"""
+    with _metrics_lock:
+        return {name: dict(counts) for name, counts in _metrics.items()}
@@ -0,0 +1,147 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import BreathingTokenUser
+from .models import BreathingSession, Friendship
+from .serializers import SessionEventSerializer
+from .transitions import SessionStateMachine, TransitionError
+
+
+# O cliente envia o JWT como subprotocolo: new WebSocket(url, ['breathing.jwt', token]).
+# Fora da URL, o token não aparece nos logs de acesso.
+TOKEN_SUBPROTOCOL = 'breathing.jwt'
+
+
+class SessionConsumer(AsyncJsonWebsocketConsumer):
+    """Canal em tempo real de uma sessão: o dono envia eventos de fase e amigos acompanham"""
+
+    async def connect(self):
+        self.session_id = self.scope['url_route']['kwargs']['session_id']
+        self.group_name = f'breathing_session_{self.session_id}'
+        self.pending_events = []
+        self.machine = None
+
+        user_id = self.authenticate()
+        session = await self.load_session() if user_id else None
+        if user_id is None:
+            await self.close(code=4401)
+            return
+        if session is None:
+            await self.close(code=4404)
+            return
+
+        self.is_owner = session.user_id == user_id
+        if not self.is_owner and not await self.are_friends(user_id, session.user_id):
+            await self.close(code=4403)
+            return
+
+        if self.is_owner:
+            self.machine = SessionStateMachine(session)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept(subprotocol=TOKEN_SUBPROTOCOL)
+        await self.send_json({
+            'type': 'session.state',
+            'session': self.session_id,
+            'status': session.status,
+            'hold_times': session.hold_times,
+        })
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.pending_events:
+            await self.flush()
+
+    async def receive_json(self, content, **kwargs):
+        if not self.is_owner:
+            await self.send_error('Apenas o dono da sessão pode enviar eventos')
+            return
+
+        serializer = SessionEventSerializer(data=content)
+        if not serializer.is_valid():
+            await self.send_error(serializer.errors)
+            return
+        event = serializer.validated_data
+
+        # Validação e projeção do estado em memória: o ack não espera o banco
+        try:
+            self.machine.apply_event(event)
+        except TransitionError as error:
+            await self.send_error(error.message, action=event['action'])
+            return
+        self.pending_events.append(event)
+
+        payload = {
+            'action': event['action'],
+            'at': event['at'].isoformat(),
+            'status': self.machine.session.status,
+            'round_number': event.get('round_number'),
+        }
+        # Tempos aplicados ao round (informados ou calculados pelo início da fase)
+        round_changes = self.machine.round_changes.get(event.get('round_number'), {})
+        if event['action'] == 'end_hold':
+            payload['hold_seconds'] = round_changes.get('hold_seconds')
+        elif event['action'] == 'end_recovery':
+            payload['recovery_seconds'] = round_changes.get('recovery_seconds')
+        await self.send_json({'type': 'ack', **payload})
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'session.event',
+            'sender': self.channel_name,
+            'event': payload,
+        })
+
+        flush_size = getattr(settings, 'BREATHING_WS_FLUSH_EVENTS', 20)
+        if len(self.pending_events) >= flush_size or event['action'] in ('complete', 'cancel'):
+            await self.flush()
+
+    async def session_event(self, message):
+        """Repassa a transição de fase para os assinantes (amigos)"""
+        if message['sender'] != self.channel_name:
+            await self.send_json({'type': 'session.event', **message['event']})
+
+    async def flush(self):
+        """Grava em lote os eventos já confirmados ao cliente"""
+        count = len(self.pending_events)
+        self.pending_events = []
+        try:
+            await database_sync_to_async(self.machine.commit)()
+        except TransitionError as error:
+            # A sessão mudou por outro caminho: recarregar e informar o cliente
+            session = await self.load_session()
+            self.machine = SessionStateMachine(session)
+            await self.send_error(error.message, resync=True)
+            await self.send_json({
+                'type': 'session.state',
+                'session': self.session_id,
+                'status': session.status,
+                'hold_times': session.hold_times,
+            })
+            return
+        await self.send_json({'type': 'persisted', 'events': count})
+
+    async def send_error(self, error, **extra):
+        await self.send_json({'type': 'error', 'error': error, **extra})
+
+    def authenticate(self):
+        """Valida o JWT enviado após o subprotocolo breathing.jwt e retorna o id do usuário"""
+        subprotocols = self.scope.get('subprotocols') or []
+        if len(subprotocols) != 2 or subprotocols[0] != TOKEN_SUBPROTOCOL:
+            return None
+        raw_token = subprotocols[1]
+        try:
+            user = BreathingTokenUser(AccessToken(raw_token))
+            return user.id if user.is_active else None
+        except (InvalidToken, TokenError, KeyError, TypeError, ValueError):
+            return None
+
+    @database_sync_to_async
+    def load_session(self):
+        return BreathingSession.objects.filter(
+            pk=self.session_id
+        ).prefetch_related('round_times').first()
+
+    @database_sync_to_async
+    def are_friends(self, user_id, other_id):
+        return Friendship.are_friends(user_id, other_id)
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def percentile(values, fraction):
+    """Valor no percentil `fraction` (0-1) de uma lista já ordenada"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+@contextmanager
+def count_queries():
+    """Lista (preenchida durante o bloco) com o SQL executado na conexão atual"""
+    executed = []
+
+    def count_query(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        yield executed
+
+
+def bulk_create_with_pks(model, objs, key_fields, batch_size=None):
+    """bulk_create garantindo a chave primária nos objetos criados.
+
+    Em backends sem RETURNING as chaves são relidas pelos campos de
+    key_fields, que precisam identificar cada objeto do lote no banco.
+    """
+    created = model.objects.bulk_create(objs, batch_size=batch_size)
+    if not created or created[0].pk is not None:
+        return created
+
+    def key(values):
+        return tuple(values[field] for field in key_fields)
+
+    lookup = {f'{field}__in': {getattr(obj, field) for obj in created} for field in key_fields}
+    pks = {
+        key(values): values['pk']
+        for values in model.objects.filter(**lookup).values('pk', *key_fields)
+    }
+    for obj in created:
+        obj.pk = pks[tuple(getattr(obj, field) for field in key_fields)]
+    return created
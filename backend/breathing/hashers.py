@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt com o custo de BREATHING_SCRYPT_*.
+
+    Hashes com outro custo (ou de outro algoritmo, como o PBKDF2 anterior)
+    são refeitos no próximo login bem-sucedido.
+    """
+    work_factor = getattr(settings, 'BREATHING_SCRYPT_WORK_FACTOR', 2 ** 15)
+    block_size = getattr(settings, 'BREATHING_SCRYPT_BLOCK_SIZE', 8)
+    parallelism = getattr(settings, 'BREATHING_SCRYPT_PARALLELISM', 1)
+    # Memória usada: 128 * work_factor * block_size bytes (com folga de 2x)
+    maxmem = 2 * 128 * work_factor * block_size
@@ -0,0 +1,99 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import increment
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def get_cache():
+    """Backend de cache das respostas guardadas por Idempotency-Key"""
+    return caches[getattr(settings, 'BREATHING_IDEMPOTENCY_CACHE_ALIAS', 'default')]
+
+
+def _key(request, idempotency_key):
+    # Chave do cliente vale apenas para o mesmo usuário, método e endpoint
+    scope = f'{request.user.id}:{request.method}:{request.path}:{idempotency_key}'
+    return f'breathing:idempotency:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent_response(request, view, compute):
+    """Executa compute uma única vez por Idempotency-Key e repete a resposta nas novas tentativas.
+
+    Sem o cabeçalho a requisição segue normalmente. Apenas respostas 2xx ficam
+    guardadas (por BREATHING_IDEMPOTENCY_TTL segundos): erros de validação ou
+    conflitos podem ser corrigidos e tentados de novo com a mesma chave.
+    Enquanto a primeira requisição não termina, as repetições recebem 409.
+    """
+    idempotency_key = request.headers.get(HEADER)
+    if not idempotency_key:
+        return compute()
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        return Response(
+            {'error': f'{HEADER} deve ter no máximo {MAX_KEY_LENGTH} caracteres'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cache = get_cache()
+    key = _key(request, idempotency_key)
+    fingerprint = _fingerprint(request)
+    stored = cache.get(key)
+    if stored is None:
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, fingerprint, getattr(settings, 'BREATHING_IDEMPOTENCY_LOCK_TIMEOUT', 30)):
+            # Outra tentativa com a mesma chave ainda está em andamento
+            stored = cache.get(key)
+            if stored is None:
+                return Response(
+                    {'error': 'Requisição com esta Idempotency-Key ainda em andamento'},
+                    status=status.HTTP_409_CONFLICT
+                )
+        else:
+            try:
+                response = compute()
+                if status.is_success(response.status_code):
+                    cache.set(key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, getattr(settings, 'BREATHING_IDEMPOTENCY_TTL', 86400))
+            finally:
+                cache.delete(lock_key)
+            return response
+
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'error': f'{HEADER} já usada com outro corpo de requisição'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    increment('breathing_idempotent_replays_total', view)
+    return _replay(stored)
+
+
+def idempotent(method):
+    """Aplica idempotent_response a uma ação de ViewSet"""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return idempotent_response(
+            request, f'{type(self).__name__}.{method.__name__}',
+            lambda: method(self, request, *args, **kwargs)
+        )
+    return wrapper
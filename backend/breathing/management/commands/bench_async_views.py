@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Pares (view síncrona, view assíncrona) comparados pelo benchmark
+ENDPOINTS = [
+    ('active', '/api/sessions/active/', '/api/async/sessions/active/'),
+    ('friends', '/api/friendships/friends/', '/api/async/friendships/friends/'),
+    ('search', '/api/users/search/?q=bench', '/api/async/users/search/?q=bench'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a vazão das views síncronas e assíncronas sob ASGI em um único "
+        "processo, simulando um banco lento"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Requisições por endpoint")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requisições simultâneas")
+        parser.add_argument(
+            '--db-latency-ms', type=float, default=20,
+            help="Atraso adicionado a cada query para simular um banco lento"
+        )
+        parser.add_argument(
+            '--username', help="Usuário existente para autenticar (padrão: usuário temporário)"
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests e --concurrency devem ser positivos.")
+
+        temporary_user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f"Usuário {options['username']} não encontrado.")
+        else:
+            user = temporary_user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:12]}')
+
+        latency = options['db_latency_ms'] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def install_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        token = str(RefreshToken.for_user(user).access_token)
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        connection.close()
+        connection_created.connect(install_delay)
+        try:
+            # Como no runner de testes, o host padrão do cliente de teste é liberado
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = asyncio.run(self.run_all(token, options))
+        finally:
+            connection_created.disconnect(install_delay)
+            request_logger.setLevel(previous_level)
+            connection.close()
+            if temporary_user is not None:
+                temporary_user.delete()
+
+        self.stdout.write(
+            f"{options['requests']} requisições por endpoint, concorrência "
+            f"{options['concurrency']}, +{options['db_latency_ms']:.0f}ms por query\n"
+        )
+        header = f"{'endpoint':<10}{'modo':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, mode, throughput, p50, p95 in results:
+            self.stdout.write(f"{name:<10}{mode:<8}{throughput:>10.1f}{p50:>10.1f}{p95:>10.1f}")
+
+    async def run_all(self, token, options):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {token}'}
+        results = []
+        for name, sync_url, async_url in ENDPOINTS:
+            for mode, url in (('sync', sync_url), ('async', async_url)):
+                results.append((name, mode, *await self.run_endpoint(client, url, headers, options)))
+        return results
+
+    async def run_endpoint(self, client, url, headers, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+
+        async def one_request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                # 404 é a resposta normal de /active/ sem sessão em andamento
+                if response.status_code in (401, 403) or response.status_code >= 500:
+                    raise CommandError(f"{url} respondeu {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return options['requests'] / elapsed, statistics.median(latencies), p95
@@ -0,0 +1,271 @@
+import json
+import logging
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from breathing.dbutils import count_queries, percentile
+
+from .seed_benchmark_data import SEED_PASSWORD
+
+# Endpoints na ordem em que aparecem no fluxo (e no relatório)
+ENDPOINTS = [
+    'register', 'login', 'create', 'next_round', 'start_hold', 'end_hold',
+    'end_recovery', 'complete', 'stats',
+]
+
+
+class FlowError(Exception):
+    """Resposta inesperada durante um fluxo do benchmark"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa o ciclo completo de uma sessão (registro, login, criação, rounds, "
+        "conclusão e estatísticas) com concorrência e compara com um baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=50, help="Fluxos completos executados")
+        parser.add_argument('--concurrency', type=int, default=4, help="Fluxos simultâneos")
+        parser.add_argument('--rounds', type=int, default=3, help="Rounds por sessão")
+        parser.add_argument(
+            '--base-url',
+            help="Servidor em execução (ex.: http://127.0.0.1:8000); sem ele as requisições "
+                 "rodam no próprio processo e as queries são contadas. Todos os logins saem "
+                 "do mesmo IP: ajuste DEFAULT_THROTTLE_RATES['login_ip'] do servidor"
+        )
+        parser.add_argument(
+            '--seeded-prefix',
+            help="Usa os usuários de seed_benchmark_data com este prefixo (com histórico "
+                 "e amigos) em vez de registrar usuários novos"
+        )
+        parser.add_argument('--baseline', help="Arquivo JSON com o resultado de referência")
+        parser.add_argument(
+            '--save-baseline', help="Grava o resultado desta execução como referência neste arquivo"
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=25,
+            help="Aumento máximo (%%) do p95 em relação ao baseline"
+        )
+        parser.add_argument(
+            '--min-regression-ms', type=float, default=2,
+            help="Diferenças de p95 menores que isto (ms) são tratadas como ruído"
+        )
+        parser.add_argument(
+            '--keep', action='store_true', help="Mantém os usuários registrados pelo benchmark"
+        )
+
+    def handle(self, *args, **options):
+        if options['flows'] < 1 or options['concurrency'] < 1 or options['rounds'] < 1:
+            raise CommandError("--flows, --concurrency e --rounds devem ser positivos.")
+
+        seeded = []
+        if options['seeded_prefix']:
+            seeded = list(User.objects.filter(
+                username__startswith=f"{options['seeded_prefix']}_"
+            ).order_by('id').values_list('username', flat=True))
+            if not seeded:
+                raise CommandError(
+                    f"Nenhum usuário com o prefixo {options['seeded_prefix']}_: "
+                    "execute seed_benchmark_data antes."
+                )
+
+        self.prefix = f'bench{uuid.uuid4().hex[:6]}_'
+        self.in_process = not options['base_url']
+        self.local = threading.local()
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        started = time.perf_counter()
+        try:
+            # Como no runner de testes, o host padrão do cliente de teste é liberado
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                    ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = [
+                    executor.submit(self.run_flow, number, seeded, options)
+                    for number in range(options['flows'])
+                ]
+                errors = [future.exception() for future in futures if future.exception()]
+        finally:
+            request_logger.setLevel(previous_level)
+            if self.in_process and not options['keep']:
+                User.objects.filter(username__startswith=self.prefix).delete()
+        elapsed = time.perf_counter() - started
+
+        if errors:
+            raise CommandError(f"{len(errors)} fluxo(s) falharam; primeiro erro: {errors[0]}")
+
+        results = self.summarize()
+        self.report(results, elapsed, options)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+            self.stdout.write(f"\nBaseline gravado em {options['save_baseline']}")
+        if options['baseline']:
+            self.compare(results, options)
+
+    # Requisições
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+        return self.local.client
+
+    def call(self, name, method, path, options, data=None, token=None, expected=200):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        executed = []
+
+        started = time.perf_counter()
+        if self.in_process:
+            client = self.client()
+            with count_queries() as executed:
+                if method == 'GET':
+                    response = client.get(path, headers=headers, REMOTE_ADDR=self.local.address)
+                else:
+                    response = client.post(
+                        path, data or {}, content_type='application/json', headers=headers,
+                        REMOTE_ADDR=self.local.address
+                    )
+            status_code, body = response.status_code, response.content
+        else:
+            status_code, body = self.http(method, path, data, headers, options)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        if status_code != expected:
+            raise FlowError(f"{name}: {method} {path} respondeu {status_code}: {body[:200]!r}")
+        with self.lock:
+            self.samples[name].append((elapsed, len(executed) if self.in_process else None))
+        return json.loads(body) if body else None
+
+    def http(self, method, path, data, headers, options):
+        request = urllib.request.Request(
+            options['base_url'].rstrip('/') + path,
+            data=json.dumps(data or {}).encode() if method == 'POST' else None,
+            headers={'Content-Type': 'application/json', **headers},
+            method=method,
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    # Fluxo
+
+    def run_flow(self, number, seeded, options):
+        # Cada fluxo simula um cliente com IP próprio (o login é limitado por IP)
+        self.local.address = f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}'
+        try:
+            password = SEED_PASSWORD
+            if seeded:
+                username = seeded[number % len(seeded)]
+            else:
+                username = f'{self.prefix}{number}'
+                self.call('register', 'POST', '/api/auth/register/', options, {
+                    'username': username, 'password': password, 'password_confirm': password,
+                }, expected=201)
+
+            token = self.call('login', 'POST', '/api/auth/login/', options, {
+                'username': username, 'password': password,
+            })['access']
+
+            session = self.call('create', 'POST', '/api/sessions/', options, {
+                'rounds': options['rounds'], 'breaths_per_round': 30, 'breath_duration': 3.55,
+            }, token=token, expected=201)
+            base = f"/api/sessions/{session['id']}"
+
+            for round_number in range(1, options['rounds'] + 1):
+                self.call('next_round', 'POST', f'{base}/next_round/', options, token=token)
+                self.call('start_hold', 'POST', f'{base}/start_hold/', options, token=token)
+                self.call('end_hold', 'POST', f'{base}/end_hold/', options, {
+                    'round_number': round_number, 'hold_seconds': 60 + round_number * 15,
+                }, token=token)
+                self.call('end_recovery', 'POST', f'{base}/end_recovery/', options, {
+                    'round_number': round_number, 'recovery_seconds': 15,
+                }, token=token)
+
+            self.call('complete', 'POST', f'{base}/complete/', options, token=token)
+            self.call('stats', 'GET', '/api/sessions/stats/', options, token=token)
+        finally:
+            if self.in_process:
+                connection.close()
+
+    # Relatório
+
+    def summarize(self):
+        results = {}
+        for name in ENDPOINTS:
+            samples = self.samples.get(name)
+            if not samples:
+                continue
+            latencies = sorted(latency for latency, _ in samples)
+            queries = [count for _, count in samples if count is not None]
+            results[name] = {
+                'requests': len(samples),
+                'p50': round(statistics.median(latencies), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'queries': statistics.median(queries) if queries else None,
+            }
+        return results
+
+    def report(self, results, elapsed, options):
+        mode = options['base_url'] or 'em processo'
+        self.stdout.write(
+            f"{options['flows']} fluxos, concorrência {options['concurrency']}, "
+            f"{options['rounds']} rounds ({mode}): {options['flows'] / elapsed:.1f} fluxos/s\n"
+        )
+        header = f"{'endpoint':<14}{'reqs':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, result in results.items():
+            queries = '-' if result['queries'] is None else f"{result['queries']:.0f}"
+            self.stdout.write(
+                f"{name:<14}{result['requests']:>7}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+                f"{result['p99']:>10.2f}{queries:>10}"
+            )
+
+    def compare(self, results, options):
+        try:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Não foi possível ler o baseline: {error}")
+
+        limit = 1 + options['max_regression'] / 100
+        regressions = []
+        for name, result in results.items():
+            reference = baseline.get(name)
+            if reference is None:
+                continue
+            if (result['p95'] > reference['p95'] * limit
+                    and result['p95'] - reference['p95'] > options['min_regression_ms']):
+                regressions.append(
+                    f"{name}: p95 {reference['p95']:.2f}ms -> {result['p95']:.2f}ms"
+                )
+            if (result['queries'] is not None and reference.get('queries') is not None
+                    and result['queries'] > reference['queries']):
+                regressions.append(
+                    f"{name}: queries {reference['queries']:.0f} -> {result['queries']:.0f}"
+                )
+
+        if regressions:
+            raise CommandError("Regressões em relação ao baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            f"\nSem regressões acima de {options['max_regression']:.0f}% em relação ao baseline."
+        ))
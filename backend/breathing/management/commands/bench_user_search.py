@@ -0,0 +1,110 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from breathing.dbutils import bulk_create_with_pks, count_queries, percentile
+from breathing.search import index_users, search_users
+
+# Sílabas para gerar nomes variados (a distribuição dos trigramas afeta a busca aproximada)
+SYLLABLES = [
+    consonant + vowel
+    for consonant in [
+        'b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v',
+        'x', 'z', 'br', 'cr', 'dr', 'fr', 'gr', 'pr', 'tr', 'ch', 'lh', 'nh',
+    ]
+    for vowel in 'aeiou'
+]
+
+
+class Command(BaseCommand):
+    help = "Mede a latência da busca de usuários (prefixo e aproximada) com muitos usuários"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help="Usuários sintéticos criados")
+        parser.add_argument('--queries', type=int, default=200, help="Buscas por tipo")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Tamanho dos lotes de escrita")
+        parser.add_argument('--seed', type=int, default=42, help="Semente dos nomes e consultas")
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Mantém os usuários sintéticos (para repetir a medição sem recriá-los)"
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['queries'] < 1:
+            raise CommandError("--users e --queries devem ser positivos.")
+
+        rng = random.Random(options['seed'])
+        prefix = f'bench{uuid.uuid4().hex[:6]}_'
+        usernames = self.create_users(prefix, rng, options)
+        searcher = User.objects.create_user(f'{prefix}searcher')
+
+        try:
+            samples = rng.sample(usernames, min(options['queries'], len(usernames)))
+            kinds = {
+                'prefixo': [name[:len(prefix) + 4] for name in samples],
+                'aproximada': [self.typo(name[len(prefix):], rng) for name in samples],
+                'icontains': [self.typo(name[len(prefix):], rng) for name in samples],
+            }
+
+            self.stdout.write(f"{len(usernames)} usuários, {len(samples)} buscas por tipo\n")
+            header = f"{'busca':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}"
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+            for kind, queries in kinds.items():
+                self.report(kind, searcher, queries)
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def create_users(self, prefix, rng, options):
+        usernames = []
+        batch_size = options['batch_size']
+        for start in range(0, options['users'], batch_size):
+            batch = []
+            for number in range(start, min(start + batch_size, options['users'])):
+                name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                batch.append(User(username=f'{prefix}{name}{number}', password='!'))
+            # bulk_create não dispara post_save: o índice é gravado em seguida
+            created = bulk_create_with_pks(User, batch, ['username'], batch_size=batch_size)
+            index_users(created, batch_size=batch_size)
+            usernames.extend(user.username for user in batch)
+            self.stdout.write(f"  {len(usernames)} usuários indexados", ending='\r')
+        self.stdout.write('')
+        return usernames
+
+    def typo(self, name, rng):
+        """Troca um caractere do meio do nome para exercitar a busca aproximada"""
+        position = rng.randrange(1, max(2, len(name) - 1))
+        return name[:position] + rng.choice('xyz') + name[position + 1:]
+
+    def report(self, kind, searcher, queries):
+        latencies = []
+        query_counts = []
+
+        # Passada de aquecimento: cache dos tamanhos das listas de trigramas
+        for query in queries:
+            self.run_query(kind, searcher, query)
+
+        for query in queries:
+            with count_queries() as executed:
+                started = time.perf_counter()
+                self.run_query(kind, searcher, query)
+                latencies.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(executed))
+
+        latencies.sort()
+        self.stdout.write(
+            f"{kind:<12}{statistics.median(latencies):>10.2f}{percentile(latencies, 0.95):>10.2f}"
+            f"{percentile(latencies, 0.99):>10.2f}{statistics.median(query_counts):>10.0f}"
+        )
+
+    def run_query(self, kind, searcher, query):
+        if kind == 'icontains':
+            # Implementação anterior, para comparação
+            list(User.objects.filter(username__icontains=query).exclude(id=searcher.id)[:10])
+        else:
+            search_users(searcher, query)
@@ -0,0 +1,50 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from breathing.models import BreathingSession
+from breathing.transfer import FORMATS, export_rows, render_rows
+
+
+class Command(BaseCommand):
+    help = "Exporta sessões (com rounds e estatísticas) em JSON Lines ou CSV, em streaming"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help="Exporta apenas este usuário (pode ser repetido); sem ele, todos, com a coluna user"
+        )
+        parser.add_argument('--file-format', choices=FORMATS, default='jsonl', help="Formato do arquivo")
+        parser.add_argument('--output', default='-', help="Arquivo de saída (padrão: saída padrão)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Sessões lidas por bloco")
+
+    def handle(self, *args, **options):
+        sessions = BreathingSession.objects.all()
+        include_user = not options['usernames']
+        if options['usernames']:
+            user_ids = list(
+                User.objects.filter(username__in=options['usernames']).values_list('id', flat=True)
+            )
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError("Um ou mais usuários não foram encontrados.")
+            sessions = sessions.filter(user_id__in=user_ids)
+            include_user = len(user_ids) > 1
+
+        rows = export_rows(sessions, include_user=include_user, chunk_size=options['chunk_size'])
+        output = (
+            sys.stdout if options['output'] == '-'
+            else open(options['output'], 'w', encoding='utf-8', newline='')
+        )
+        count = 0
+        try:
+            for line in render_rows(rows, options['file_format'], include_user=include_user):
+                output.write(line)
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output'] != '-':
+            sessions_written = count - 1 if options['file_format'] == 'csv' else count
+            self.stdout.write(self.style.SUCCESS(f"{sessions_written} sessões exportadas."))
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from breathing.transfer import FORMATS, ImportRowError, import_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa o histórico de sessões de um arquivo JSON Lines ou CSV para um usuário "
+        "(sessões com o mesmo started_at são puladas)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Arquivo .jsonl ou .csv")
+        parser.add_argument('--user', required=True, help="Usuário que recebe as sessões")
+        parser.add_argument(
+            '--file-format', choices=FORMATS,
+            help="Formato do arquivo (padrão: pela extensão)"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Sessões gravadas por lote")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size deve ser positivo.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário {options['user']} não encontrado.")
+
+        file_format = options['file_format'] or (
+            'csv' if options['path'].lower().endswith('.csv') else 'jsonl'
+        )
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                imported, skipped = import_sessions(
+                    user.pk, lines, file_format, batch_size=options['batch_size']
+                )
+        except OSError as error:
+            raise CommandError(f"Não foi possível ler o arquivo: {error}")
+        except ImportRowError as error:
+            raise CommandError(error.message)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} sessões importadas, {skipped} já existentes puladas."
+        ))
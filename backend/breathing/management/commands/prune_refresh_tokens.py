@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from breathing.models import RefreshTokenRecord
+
+
+class Command(BaseCommand):
+    help = "Apaga em lotes os refresh tokens vencidos (executar periodicamente, ex.: cron diário)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Tokens apagados por lote")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size deve ser positivo.")
+
+        deleted = RefreshTokenRecord.prune(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} refresh tokens vencidos removidos."))
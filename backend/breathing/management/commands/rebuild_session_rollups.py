@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from breathing.models import DailySessionRollup
+
+
+class Command(BaseCommand):
+    help = "Recalcula os resumos diários de sessões e o ranking a partir do histórico completo"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help="Recalcula apenas este usuário (pode ser repetido)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Tamanho dos lotes de leitura e escrita"
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(
+                User.objects.filter(username__in=options['usernames']).values_list('id', flat=True)
+            )
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError("Um ou mais usuários não foram encontrados.")
+
+        total = DailySessionRollup.rebuild(user_ids=user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} resumos diários recalculados."))
@@ -0,0 +1,158 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from breathing.dbutils import bulk_create_with_pks
+from breathing.models import (
+    BreathingSession, DailySessionRollup, Friendship, SessionRound, UserProfile
+)
+from breathing.search import index_users
+
+# Senha de todos os usuários sintéticos (para o login do benchmark)
+SEED_PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria usuários sintéticos com amizades e anos de histórico de sessões "
+        "para benchmarks (senha de todos: benchmark-password)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Usuários criados")
+        parser.add_argument('--friends', type=int, default=20, help="Amigos aceitos por usuário")
+        parser.add_argument('--years', type=float, default=2, help="Anos de histórico por usuário")
+        parser.add_argument(
+            '--sessions-per-week', type=float, default=4, help="Média de sessões por semana"
+        )
+        parser.add_argument('--rounds', type=int, default=3, help="Rounds por sessão")
+        parser.add_argument('--prefix', default='seed', help="Prefixo dos usernames")
+        parser.add_argument('--seed', type=int, default=42, help="Semente dos dados gerados")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Tamanho dos lotes de escrita")
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError("--users deve ser pelo menos 2.")
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(
+                f"Já existem usuários com o prefixo {options['prefix']}_: use outro --prefix."
+            )
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            users = self.create_users(options)
+            user_ids = [user.pk for user in users]
+            friendships = self.create_friendships(user_ids, options)
+            sessions = self.create_sessions(user_ids, rng, options)
+
+            self.stdout.write("Recalculando resumos, ranking e perfis...")
+            DailySessionRollup.rebuild(user_ids=user_ids, batch_size=batch_size)
+            self.update_profiles(user_ids)
+            index_users(users, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} usuários, {friendships} amizades e {sessions} sessões criados "
+            f"(prefixo {options['prefix']}_)."
+        ))
+
+    def create_users(self, options):
+        password = make_password(SEED_PASSWORD)
+        users = bulk_create_with_pks(
+            User,
+            [
+                User(username=f"{options['prefix']}_{number}", password=password)
+                for number in range(options['users'])
+            ],
+            ['username'],
+            batch_size=options['batch_size'],
+        )
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user) for user in users], batch_size=options['batch_size']
+        )
+        return users
+
+    def create_friendships(self, user_ids, options):
+        """Amizades em anel: cada usuário é amigo dos vizinhos mais próximos"""
+        total = len(user_ids)
+        reach = min(options['friends'] // 2 or 1, (total - 1) // 2 or 1)
+        friendships = {}
+        for index, user_id in enumerate(user_ids):
+            for step in range(1, reach + 1):
+                other_id = user_ids[(index + step) % total]
+                if other_id == user_id:
+                    continue
+                pair_key = Friendship.make_pair_key(user_id, other_id)
+                friendships.setdefault(pair_key, Friendship(
+                    requester_id=user_id, addressee_id=other_id,
+                    status='accepted', pair_key=pair_key
+                ))
+        Friendship.objects.bulk_create(
+            friendships.values(), batch_size=options['batch_size'], ignore_conflicts=True
+        )
+        return len(friendships)
+
+    def create_sessions(self, user_ids, rng, options):
+        now = timezone.now()
+        span = timedelta(days=365 * options['years'])
+        per_user = max(1, int(options['years'] * 52 * options['sessions_per_week']))
+        breaths, breath_duration = 30, 3.55
+        planned = timedelta(seconds=options['rounds'] * breaths * breath_duration)
+
+        users_per_batch = max(1, options['batch_size'] // per_user)
+        created = 0
+        for start in range(0, len(user_ids), users_per_batch):
+            sessions = []
+            for user_id in user_ids[start:start + users_per_batch]:
+                for _ in range(per_user):
+                    started_at = now - span * rng.random()
+                    duration = planned + timedelta(seconds=rng.randint(60, 600))
+                    sessions.append(BreathingSession(
+                        user_id=user_id,
+                        rounds=options['rounds'],
+                        breaths_per_round=breaths,
+                        breath_duration=breath_duration,
+                        planned_duration=planned,
+                        status='completed',
+                        started_at=started_at,
+                        completed_at=started_at + duration,
+                        actual_duration=duration,
+                    ))
+            sessions = BreathingSession.objects.bulk_create(sessions)
+
+            SessionRound.objects.bulk_create(
+                [
+                    SessionRound(
+                        session=session,
+                        round_number=number,
+                        hold_seconds=rng.randint(30, 150),
+                        recovery_seconds=15,
+                    )
+                    for session in sessions
+                    for number in range(1, options['rounds'] + 1)
+                ],
+                batch_size=options['batch_size'],
+            )
+            created += len(sessions)
+            self.stdout.write(f"  {created} sessões", ending='\r')
+        self.stdout.write('')
+        return created
+
+    def update_profiles(self, user_ids):
+        totals = BreathingSession.objects.filter(
+            user_id__in=user_ids, status='completed'
+        ).values('user_id').annotate(
+            count=Count('id'), time=Sum('actual_duration')
+        ).order_by()
+        profiles = UserProfile.objects.in_bulk(user_ids, field_name='user_id')
+        for item in totals:
+            profile = profiles[item['user_id']]
+            profile.total_sessions = item['count']
+            profile.total_breathing_time = item['time']
+        UserProfile.objects.bulk_update(profiles.values(), ['total_sessions', 'total_breathing_time'])
@@ -0,0 +1,229 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .cache import cache_metrics
+
+slow_query_logger = logging.getLogger('breathing.slow_queries')
+
+# Limites (s) dos histogramas de tempo e limites dos histogramas de contagem
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# nome -> (limites dos buckets, descrição)
+HISTOGRAMS = {
+    'breathing_request_duration_seconds': (DURATION_BUCKETS, "Tempo total da requisição"),
+    'breathing_db_queries': (COUNT_BUCKETS, "Queries executadas por requisição"),
+    'breathing_db_duration_seconds': (DURATION_BUCKETS, "Tempo em queries por requisição"),
+    'breathing_serializer_duration_seconds': (DURATION_BUCKETS, "Tempo em serializers por requisição"),
+    'breathing_login_queue_seconds': (DURATION_BUCKETS, "Espera por uma vaga de verificação de senha"),
+    'breathing_login_check_seconds': (DURATION_BUCKETS, "Verificação de senha (e atualização do hash)"),
+}
+
+# nome -> descrição
+COUNTERS = {
+    'breathing_slow_queries_total': "Queries acima de BREATHING_SLOW_QUERY_MS",
+    'breathing_login_rejected_total': "Logins recusados por falta de vaga",
+    'breathing_idempotent_replays_total': "Respostas repetidas por Idempotency-Key",
+}
+
+# Medições da requisição em andamento (propagadas para as threads de sync_to_async)
+_current = contextvars.ContextVar('breathing_request_metrics', default=None)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = defaultdict(int)
+
+
+class RequestMetrics:
+    """Acumula as medições de uma requisição"""
+    __slots__ = ('view', 'queries', 'db_seconds', 'serializer_seconds', 'serializer_depth')
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def observe(name, view, value):
+    with _lock:
+        histogram = _histograms.get((name, view))
+        if histogram is None:
+            histogram = _histograms[(name, view)] = _Histogram(HISTOGRAMS[name][0])
+        histogram.observe(value)
+
+
+def increment(name, view):
+    with _lock:
+        _counters[(name, view)] += 1
+
+
+def view_name(view_func, method):
+    """'BreathingSessionViewSet.end_hold', 'LoginView.post', 'AsyncFriendsView.get'..."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper instalado em cada conexão do banco (ver signals.py)"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_seconds += elapsed
+        threshold = getattr(settings, 'BREATHING_SLOW_QUERY_MS', None)
+        if threshold is not None and elapsed * 1000 >= threshold:
+            view = metrics.view or 'unresolved'
+            increment('breathing_slow_queries_total', view)
+            slow_query_logger.warning("%.1fms em %s: %s", elapsed * 1000, view, sql)
+
+
+class TimedSerializerMixin:
+    """Soma ao tempo de serializers da requisição a validação e a representação"""
+
+    def _timed(self, method, *args):
+        metrics = _current.get()
+        if metrics is None or metrics.serializer_depth:
+            # Serializers aninhados já estão no tempo do serializer externo
+            return method(*args)
+
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            metrics.serializer_seconds += time.perf_counter() - started
+            metrics.serializer_depth -= 1
+
+    def to_representation(self, instance):
+        return self._timed(super().to_representation, instance)
+
+    def run_validation(self, *args):
+        return self._timed(super().run_validation, *args)
+
+
+class RequestMetricsMiddleware:
+    """Registra tempo, queries e tempo de serializers por view e ação"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics, token, started = self.start()
+        try:
+            return self.get_response(request)
+        finally:
+            self.finish(metrics, token, started)
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.finish(metrics, token, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+
+    def start(self):
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, metrics, token, started):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        if metrics.view is None:
+            # 404 de roteamento: não há view para agrupar
+            return
+        observe('breathing_request_duration_seconds', metrics.view, elapsed)
+        observe('breathing_db_queries', metrics.view, metrics.queries)
+        observe('breathing_db_duration_seconds', metrics.view, metrics.db_seconds)
+        observe('breathing_serializer_duration_seconds', metrics.view, metrics.serializer_seconds)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Métricas deste processo no formato texto do Prometheus"""
+    with _lock:
+        histograms = {
+            key: (list(histogram.counts), histogram.total, histogram.count)
+            for key, histogram in _histograms.items()
+        }
+        counters = dict(_counters)
+
+    lines = []
+    for name, (buckets, description) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (metric, view), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            view = _label(view)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{view="{view}"}} {total:.6f}')
+            lines.append(f'{name}_count{{view="{view}"}} {count}')
+
+    for name, description in COUNTERS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for (metric, view), count in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{{view="{_label(view)}"}} {count}')
+
+    lines += [
+        '# HELP breathing_cache_requests_total Consultas ao cache de respostas por usuário',
+        '# TYPE breathing_cache_requests_total counter',
+    ]
+    for response, counts in sorted(cache_metrics().items()):
+        for outcome, count in sorted(counts.items()):
+            lines.append(
+                f'breathing_cache_requests_total{{response="{_label(response)}",'
+                f'outcome="{outcome}"}} {count}'
+            )
+    return '\n'.join(lines) + '\n'
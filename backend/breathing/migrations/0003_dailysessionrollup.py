@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:44
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _seconds(value):
+    # Mesma leitura tolerante de 0004: valores legados podem ser texto ou float
+    try:
+        return max(int(round(float(value or 0))), 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def backfill_rollups(apps, schema_editor):
+    BreathingSession = apps.get_model('breathing', 'BreathingSession')
+    DailySessionRollup = apps.get_model('breathing', 'DailySessionRollup')
+
+    rows = {}
+    for session in BreathingSession.objects.all().iterator(chunk_size=1000):
+        key = (session.user_id, timezone.localdate(session.started_at))
+        rollup = rows.get(key)
+        if rollup is None:
+            rollup = rows[key] = DailySessionRollup(user_id=key[0], day=key[1])
+        if session.status == 'completed' and session.actual_duration:
+            rollup.session_count += 1
+            rollup.breathing_time += session.actual_duration
+        for times in session.hold_times or []:
+            hold = _seconds(times.get('hold'))
+            if hold > 0:
+                rollup.hold_count += 1
+                rollup.total_hold_seconds += hold
+                rollup.best_hold_seconds = max(rollup.best_hold_seconds, hold)
+
+    DailySessionRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0002_breathingsession_hold_times_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySessionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Dia (fuso local) em que as sessões começaram')),
+                ('session_count', models.PositiveIntegerField(default=0, help_text='Sessões concluídas no dia')),
+                ('breathing_time', models.DurationField(default=datetime.timedelta(0))),
+                ('hold_count', models.PositiveIntegerField(default=0, help_text='Retenções registradas no dia')),
+                ('total_hold_seconds', models.PositiveIntegerField(default=0)),
+                ('best_hold_seconds', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'ordering': ['-day'],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _seconds(value):
+    try:
+        return max(int(round(float(value or 0))), 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def copy_hold_times_to_rounds(apps, schema_editor):
+    BreathingSession = apps.get_model('breathing', 'BreathingSession')
+    SessionRound = apps.get_model('breathing', 'SessionRound')
+
+    batch = []
+    sessions = BreathingSession.objects.exclude(hold_times=[]).values_list('id', 'hold_times')
+    for session_id, hold_times in sessions.iterator(chunk_size=1000):
+        for index, times in enumerate(hold_times or []):
+            batch.append(SessionRound(
+                session_id=session_id,
+                round_number=index + 1,
+                hold_seconds=_seconds(times.get('hold')),
+                recovery_seconds=_seconds(times.get('recovery')),
+            ))
+        if len(batch) >= 1000:
+            SessionRound.objects.bulk_create(batch)
+            batch = []
+    SessionRound.objects.bulk_create(batch)
+
+
+def copy_rounds_to_hold_times(apps, schema_editor):
+    BreathingSession = apps.get_model('breathing', 'BreathingSession')
+    SessionRound = apps.get_model('breathing', 'SessionRound')
+
+    hold_times = {}
+    for session_round in SessionRound.objects.order_by('session_id', 'round_number').iterator():
+        times = hold_times.setdefault(session_round.session_id, [])
+        while len(times) < session_round.round_number - 1:
+            times.append({'hold': 0, 'recovery': 0})
+        times.append({
+            'hold': session_round.hold_seconds,
+            'recovery': session_round.recovery_seconds,
+        })
+    for session_id, times in hold_times.items():
+        BreathingSession.objects.filter(pk=session_id).update(hold_times=times)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0003_dailysessionrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('round_number', models.PositiveIntegerField(help_text='Número do round (a partir de 1)')),
+                ('hold_seconds', models.PositiveIntegerField(default=0, help_text='Tempo de retenção em segundos')),
+                ('recovery_seconds', models.PositiveIntegerField(default=0, help_text='Tempo de recuperação em segundos')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='round_times', to='breathing.breathingsession')),
+            ],
+            options={
+                'verbose_name': 'Round da Sessão',
+                'verbose_name_plural': 'Rounds das Sessões',
+                'ordering': ['round_number'],
+                'unique_together': {('session', 'round_number')},
+            },
+        ),
+        migrations.RunPython(copy_hold_times_to_rounds, copy_rounds_to_hold_times),
+        migrations.RemoveField(
+            model_name='breathingsession',
+            name='hold_times',
+        ),
+    ]
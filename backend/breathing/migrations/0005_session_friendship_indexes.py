@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0004_sessionround'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(fields=['user', '-started_at'], name='session_user_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(fields=['user', 'status', 'completed_at'], name='session_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(condition=models.Q(('status', 'in_progress')), fields=['user', '-started_at'], name='session_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['addressee', 'status'], name='friendship_addressee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['requester', 'status'], name='friendship_requester_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+# Mesmo limite de FeedEntry.BACKFILL_SESSIONS: as sessões mais recentes de cada amigo
+BACKFILL_SESSIONS = 50
+
+
+def backfill_feed(apps, schema_editor):
+    BreathingSession = apps.get_model('breathing', 'BreathingSession')
+    Friendship = apps.get_model('breathing', 'Friendship')
+    FeedEntry = apps.get_model('breathing', 'FeedEntry')
+
+    friends = {}
+    for requester_id, addressee_id in Friendship.objects.filter(
+        status='accepted'
+    ).values_list('requester_id', 'addressee_id'):
+        friends.setdefault(requester_id, set()).add(addressee_id)
+        friends.setdefault(addressee_id, set()).add(requester_id)
+
+    entries = []
+    for actor_id, owner_ids in friends.items():
+        sessions = BreathingSession.objects.filter(
+            user_id=actor_id, status='completed', completed_at__isnull=False
+        ).annotate(
+            total_hold=Sum('round_times__hold_seconds')
+        ).order_by('-completed_at')[:BACKFILL_SESSIONS]
+        for session in sessions:
+            for owner_id in owner_ids:
+                entries.append(FeedEntry(
+                    owner_id=owner_id,
+                    actor_id=actor_id,
+                    session_id=session.pk,
+                    rounds=session.rounds,
+                    started_at=session.started_at,
+                    completed_at=session.completed_at,
+                    actual_duration=session.actual_duration,
+                    total_hold_seconds=session.total_hold or 0,
+                ))
+        if len(entries) >= 1000:
+            FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0005_session_friendship_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rounds', models.PositiveIntegerField()),
+                ('started_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField()),
+                ('actual_duration', models.DurationField(blank=True, null=True)),
+                ('total_hold_seconds', models.PositiveIntegerField(default=0)),
+                ('actor', models.ForeignKey(help_text='Amigo que concluiu a sessão', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(help_text='Dono da linha do tempo', on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='breathing.breathingsession')),
+            ],
+            options={
+                'verbose_name': 'Entrada do Feed',
+                'verbose_name_plural': 'Entradas do Feed',
+                'ordering': ['-completed_at', '-id'],
+                'indexes': [models.Index(fields=['owner', '-completed_at', '-id'], name='feed_owner_idx'), models.Index(fields=['owner', 'actor', '-completed_at'], name='feed_owner_actor_idx')],
+                'unique_together': {('owner', 'session')},
+            },
+        ),
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
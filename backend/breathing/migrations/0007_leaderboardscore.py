@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:57
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_scores(apps, schema_editor):
+    DailySessionRollup = apps.get_model('breathing', 'DailySessionRollup')
+    LeaderboardScore = apps.get_model('breathing', 'LeaderboardScore')
+
+    rows = {}
+    for rollup in DailySessionRollup.objects.order_by().iterator(chunk_size=1000):
+        year, week, _ = rollup.day.isocalendar()
+        for period in ('all', f"{year}-W{week:02d}"):
+            score = rows.get((rollup.user_id, period))
+            if score is None:
+                score = rows[(rollup.user_id, period)] = LeaderboardScore(
+                    user_id=rollup.user_id, period=period
+                )
+            score.session_count += rollup.session_count
+            score.breathing_time += rollup.breathing_time
+            score.best_hold_seconds = max(score.best_hold_seconds, rollup.best_hold_seconds)
+
+    LeaderboardScore.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0006_feedentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(help_text="'all' ou semana ISO no formato 2026-W01", max_length=8)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('breathing_time', models.DurationField(default=datetime.timedelta(0))),
+                ('best_hold_seconds', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pontuação do Ranking',
+                'verbose_name_plural': 'Pontuações do Ranking',
+                'unique_together': {('period', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:59
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Cópias de breathing.search da época desta migração: o histórico não
+# deve mudar com edições no código do app
+def normalize_term(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in value if not unicodedata.combining(char)).strip().lower()
+
+
+def trigrams(term):
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def backfill_search_index(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserSearchTerm = apps.get_model('breathing', 'UserSearchTerm')
+    UserSearchTrigram = apps.get_model('breathing', 'UserSearchTrigram')
+
+    terms, grams = [], []
+    for user_id, username in User.objects.values_list('id', 'username').iterator(chunk_size=1000):
+        term = normalize_term(username)
+        terms.append(UserSearchTerm(user_id=user_id, term=term))
+        grams.extend(UserSearchTrigram(user_id=user_id, trigram=trigram) for trigram in trigrams(term))
+        if len(grams) >= 10000:
+            UserSearchTerm.objects.bulk_create(terms, batch_size=1000)
+            UserSearchTrigram.objects.bulk_create(grams, batch_size=1000)
+            terms, grams = [], []
+    UserSearchTerm.objects.bulk_create(terms, batch_size=1000)
+    UserSearchTrigram.objects.bulk_create(grams, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('breathing', '0007_leaderboardscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_term', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('term', models.CharField(db_index=True, max_length=150)),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca',
+                'verbose_name_plural': 'Termos de Busca',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trigrama de Busca',
+                'verbose_name_plural': 'Trigramas de Busca',
+                'unique_together': {('trigram', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
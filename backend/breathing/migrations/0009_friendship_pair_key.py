@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+# Ao deduplicar pares invertidos, mantém a relação mais forte
+STATUS_PRIORITY = {'blocked': 0, 'accepted': 1, 'pending': 2, 'rejected': 3}
+
+
+def fill_pair_keys(apps, schema_editor):
+    Friendship = apps.get_model('breathing', 'Friendship')
+
+    pairs = {}
+    for friendship in Friendship.objects.order_by('created_at', 'id').iterator(chunk_size=1000):
+        low, high = sorted((friendship.requester_id, friendship.addressee_id))
+        pairs.setdefault(f"{low}:{high}", []).append(friendship)
+
+    duplicates = []
+    keep = []
+    for pair_key, friendships in pairs.items():
+        friendships.sort(key=lambda friendship: STATUS_PRIORITY.get(friendship.status, len(STATUS_PRIORITY)))
+        friendships[0].pair_key = pair_key
+        keep.append(friendships[0])
+        duplicates.extend(friendship.pk for friendship in friendships[1:])
+
+    for start in range(0, len(duplicates), 1000):
+        Friendship.objects.filter(pk__in=duplicates[start:start + 1000]).delete()
+    Friendship.objects.bulk_update(keep, ['pair_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0008_user_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='friendship',
+            name='pair_key',
+            field=models.CharField(editable=False, max_length=41, null=True),
+        ),
+        migrations.RunPython(fill_pair_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='friendship',
+            name='pair_key',
+            field=models.CharField(editable=False, max_length=41, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendship',
+            unique_together=set(),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0009_friendship_pair_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshTokenRecord',
+            fields=[
+                ('jti', models.UUIDField(primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('revoked_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Refresh Token',
+                'verbose_name_plural': 'Refresh Tokens',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathing', '0010_refreshtokenrecord'),
+    ]
+
+    # Só o estado muda (o default é do Python); evita reconstruir a tabela no SQLite
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='breathingsession',
+                    name='started_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+            ],
+        ),
+    ]
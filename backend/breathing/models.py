@@ -1,6 +1,13 @@
-from django.db import models
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .cache import FRIEND_GRAPH, cached_user_response, invalidate_user_responses
 
 
 class UserProfile(models.Model):
@@ -16,6 +23,18 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Perfil de {self.user.username}"
 
+    @classmethod
+    def add_completed_session(cls, user_id, duration):
+        """Incrementa os contadores do perfil de forma atômica no banco"""
+        changes = {
+            'total_sessions': F('total_sessions') + 1,
+            'total_breathing_time': F('total_breathing_time') + duration,
+            'updated_at': timezone.now(),
+        }
+        if not cls.objects.filter(user_id=user_id).update(**changes):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**changes)
+
     class Meta:
         verbose_name = "Perfil do Usuário"
         verbose_name_plural = "Perfis dos Usuários"
@@ -41,17 +60,97 @@ class Friendship(models.Model):
         related_name='friendship_requests_received'
     )
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Par não ordenado "menor_id:maior_id": A->B e B->A têm a mesma chave
+    pair_key = models.CharField(max_length=41, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('requester', 'addressee')
         verbose_name = "Amizade"
         verbose_name_plural = "Amizades"
+        indexes = [
+            models.Index(fields=['addressee', 'status'], name='friendship_addressee_idx'),
+            models.Index(fields=['requester', 'status'], name='friendship_requester_idx'),
+        ]
 
     def __str__(self):
         return f"{self.requester.username} -> {self.addressee.username} ({self.status})"
 
+    # Conjuntos do grafo de amizades de um usuário (ver graph)
+    GRAPH_SETS = ('accepted', 'pending_in', 'pending_out', 'blocked', 'rejected')
+
+    @staticmethod
+    def make_pair_key(user_id, other_id):
+        low, high = sorted((int(user_id), int(other_id)))
+        return f"{low}:{high}"
+
+    @classmethod
+    def between(cls, user_id, other_id):
+        """Amizade entre os dois usuários, em qualquer direção (uma busca no índice único)"""
+        return cls.objects.filter(pair_key=cls.make_pair_key(user_id, other_id)).first()
+
+    def save(self, *args, **kwargs):
+        self.pair_key = self.make_pair_key(self.requester_id, self.addressee_id)
+        super().save(*args, **kwargs)
+        self.invalidate_graphs()
+
+    def delete(self, *args, **kwargs):
+        self.invalidate_graphs()
+        return super().delete(*args, **kwargs)
+
+    def invalidate_graphs(self):
+        """Descarta o grafo em cache dos dois usuários após o commit"""
+        invalidate_user_responses(self.requester_id, FRIEND_GRAPH)
+        invalidate_user_responses(self.addressee_id, FRIEND_GRAPH)
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Amizades e solicitações do usuário, em qualquer direção (lidas do banco)"""
+        return cls.objects.filter(Q(requester_id=user_id) | Q(addressee_id=user_id))
+
+    @classmethod
+    def graph(cls, user_id):
+        """Relações do usuário em cache: {conjunto: {id do outro usuário: id da amizade}}
+
+        A invalidação vale para o cache configurado: com vários processos ele
+        precisa ser compartilhado (Redis, Memcached). Usado apenas em leituras;
+        escritas e get_object consultam o banco.
+        """
+        return cached_user_response(FRIEND_GRAPH, user_id, lambda: cls._load_graph(user_id))
+
+    @classmethod
+    def _load_graph(cls, user_id):
+        graph = {name: {} for name in cls.GRAPH_SETS}
+        for pk, requester_id, addressee_id, status in cls.for_user(user_id).values_list(
+            'pk', 'requester_id', 'addressee_id', 'status'
+        ):
+            outgoing = requester_id == user_id
+            if status == 'pending':
+                name = 'pending_out' if outgoing else 'pending_in'
+            else:
+                name = status
+            graph[name][addressee_id if outgoing else requester_id] = pk
+        return graph
+
+    @classmethod
+    def relationship(cls, user_id, other_id):
+        """Conjunto do grafo em que other_id está, ou None se não há relação"""
+        graph = cls.graph(user_id)
+        for name in cls.GRAPH_SETS:
+            if other_id in graph[name]:
+                return name
+        return None
+
+    @classmethod
+    def are_friends(cls, user_id, other_id):
+        return other_id in cls.graph(user_id)['accepted']
+
+    @classmethod
+    def friend_ids(cls, user_id, cached=True):
+        """Ids dos amigos aceitos do usuário (cached=False lê do banco)"""
+        graph = cls.graph(user_id) if cached else cls._load_graph(user_id)
+        return list(graph['accepted'])
+
 
 class BreathingSession(models.Model):
     """Modelo para sessões de respiração"""
@@ -61,20 +160,14 @@ class BreathingSession(models.Model):
     breath_duration = models.FloatField(default=3.55, help_text="Duração de cada respiração em segundos")
     
     # Campos para rastrear tempo
-    started_at = models.DateTimeField(auto_now_add=True)
+    # default (e não auto_now_add): a importação de histórico grava o início original
+    started_at = models.DateTimeField(default=timezone.now, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     actual_duration = models.DurationField(null=True, blank=True, help_text="Duração real da sessão")
     
     # Campos calculados
     planned_duration = models.DurationField(help_text="Duração planejada calculada")
     
-    # Tempos de retenção por round (em segundos) - JSON field
-    hold_times = models.JSONField(
-        default=list, 
-        blank=True, 
-        help_text="Lista com tempos de retenção de cada round em segundos"
-    )
-    
     # Status da sessão
     STATUS_CHOICES = [
         ('in_progress', 'Em Progresso'),
@@ -93,6 +186,18 @@ class BreathingSession(models.Model):
         verbose_name = "Sessão de Respiração"
         verbose_name_plural = "Sessões de Respiração"
         ordering = ['-started_at']
+        indexes = [
+            # Histórico e listagens: filter(user=...).order_by('-started_at')
+            models.Index(fields=['user', '-started_at'], name='session_user_started_idx'),
+            # Contagens por status e período: (user, status[, completed_at])
+            models.Index(fields=['user', 'status', 'completed_at'], name='session_user_status_idx'),
+            # /active/: apenas as poucas sessões em andamento
+            models.Index(
+                fields=['user', '-started_at'],
+                condition=Q(status='in_progress'),
+                name='session_user_active_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Sessão de {self.user.username} - {self.started_at.strftime('%d/%m/%Y %H:%M')}"
@@ -107,19 +212,37 @@ class BreathingSession(models.Model):
 
     def complete_session(self):
         """Marcar sessão como concluída e calcular duração real"""
-        if self.status != 'completed' and self.status != 'cancelled':
-            self.completed_at = timezone.now()
-            self.actual_duration = self.completed_at - self.started_at
-            self.status = 'completed'
-            self.save()
-            
-            # Atualizar estatísticas do usuário apenas se ainda não foi atualizado
-            if not hasattr(self, '_stats_updated'):
-                profile, created = UserProfile.objects.get_or_create(user=self.user)
-                profile.total_sessions += 1
-                profile.total_breathing_time += self.actual_duration
-                profile.save()
-                self._stats_updated = True
+        if self.status in ('completed', 'cancelled'):
+            return False
+        
+        completed_at = timezone.now()
+        actual_duration = completed_at - self.started_at
+        with transaction.atomic():
+            # Apenas a requisição que efetivamente muda o status contabiliza a
+            # sessão, então conclusões repetidas ou concorrentes são idempotentes
+            updated = BreathingSession.objects.filter(pk=self.pk).exclude(
+                status__in=['completed', 'cancelled']
+            ).update(
+                status='completed',
+                completed_at=completed_at,
+                actual_duration=actual_duration
+            )
+            if updated:
+                self.status = 'completed'
+                self.completed_at = completed_at
+                self.actual_duration = actual_duration
+                self.record_completion()
+        
+        if not updated:
+            self.refresh_from_db(fields=['status', 'completed_at', 'actual_duration'])
+        return bool(updated)
+
+    def record_completion(self):
+        """Contabiliza a sessão recém-concluída no perfil e nos resumos"""
+        UserProfile.add_completed_session(self.user_id, self.actual_duration)
+        DailySessionRollup.record_completion(self)
+        FeedEntry.fan_out(self)
+        invalidate_user_responses(self.user_id)
 
     @property
     def duration_formatted(self):
@@ -132,36 +255,92 @@ class BreathingSession(models.Model):
             return f"{minutes}m {seconds}s"
         return "0m 0s"
 
+    @cached_property
+    def round_list(self):
+        """Rounds da sessão, lidos uma única vez (do prefetch de round_times, se houver)"""
+        return list(self.round_times.all()) if self.pk else []
+
+    @property
+    def hold_times(self):
+        """Lista com tempos de retenção/recuperação de cada round (em segundos)"""
+        rounds = self.round_list
+        if not rounds:
+            return []
+        
+        hold_times = [{'hold': 0, 'recovery': 0} for _ in range(rounds[-1].round_number)]
+        for session_round in rounds:
+            hold_times[session_round.round_number - 1] = {
+                'hold': session_round.hold_seconds,
+                'recovery': session_round.recovery_seconds
+            }
+        return hold_times
+
+    def _reset_round_cache(self):
+        getattr(self, '_prefetched_objects_cache', {}).pop('round_times', None)
+        self.__dict__.pop('round_list', None)
+
     def add_hold_time(self, round_number, hold_seconds, recovery_seconds=None):
         """Adiciona tempo de retenção para um round específico"""
-        if not self.hold_times:
-            self.hold_times = []
-        
-        # Garantir que a lista tenha tamanho suficiente
-        while len(self.hold_times) < round_number:
-            self.hold_times.append({'hold': 0, 'recovery': 0})
+        previous = self.round_times.filter(round_number=round_number).values_list(
+            'hold_seconds', flat=True
+        ).first()
         
-        # Atualizar o round específico
-        if len(self.hold_times) >= round_number:
-            self.hold_times[round_number - 1] = {
-                'hold': hold_seconds,
-                'recovery': recovery_seconds or 0
+        SessionRound.objects.update_or_create(
+            session=self,
+            round_number=round_number,
+            defaults={
+                'hold_seconds': int(hold_seconds),
+                'recovery_seconds': int(recovery_seconds or 0)
             }
-        else:
-            self.hold_times.append({
-                'hold': hold_seconds,
-                'recovery': recovery_seconds or 0
-            })
-        
-        self.save()
+        )
+        self._reset_round_cache()
+        DailySessionRollup.record_hold(self, hold_seconds, previous or 0)
+
+    def replace_hold_times(self, hold_times):
+        """Substitui os rounds pela lista [{'hold': 70, 'recovery': 15}, ...] e corrige os resumos"""
+        previous = {session_round.round_number: session_round.hold_seconds for session_round in self.round_list}
+        rounds = [
+            SessionRound(
+                session=self,
+                round_number=number,
+                hold_seconds=int(times.get('hold') or 0),
+                recovery_seconds=int(times.get('recovery') or 0),
+            )
+            for number, times in enumerate(hold_times, 1)
+        ]
+        with transaction.atomic():
+            SessionRound.objects.filter(session=self, round_number__gt=len(rounds)).delete()
+            SessionRound.objects.bulk_create(
+                rounds,
+                update_conflicts=True,
+                unique_fields=['session', 'round_number'],
+                update_fields=['hold_seconds', 'recovery_seconds'],
+            )
+            holds = {session_round.round_number: session_round.hold_seconds for session_round in rounds}
+            for number in sorted(set(previous) | set(holds)):
+                if holds.get(number, 0) != previous.get(number, 0):
+                    DailySessionRollup.record_hold(self, holds.get(number, 0), previous.get(number, 0))
+        self._set_round_cache(rounds)
+
+    def _set_round_cache(self, rounds):
+        """Guarda os rounds já gravados como prefetch de round_times, sem reler o banco"""
+        rounds = sorted(rounds, key=lambda session_round: session_round.round_number)
+        queryset = self.round_times.all()
+        queryset._result_cache = rounds
+        queryset._prefetch_done = True
+        if not hasattr(self, '_prefetched_objects_cache'):
+            self._prefetched_objects_cache = {}
+        self._prefetched_objects_cache['round_times'] = queryset
+        self.__dict__['round_list'] = rounds
 
     def get_hold_times_formatted(self):
         """Retorna os tempos de retenção formatados"""
-        if not self.hold_times:
+        hold_times = self.hold_times
+        if not hold_times:
             return []
         
         formatted_times = []
-        for i, times in enumerate(self.hold_times):
+        for i, times in enumerate(hold_times):
             hold_time = times.get('hold', 0)
             recovery_time = times.get('recovery', 0)
             
@@ -188,19 +367,36 @@ class BreathingSession(models.Model):
     @property
     def total_hold_time(self):
         """Retorna o tempo total de retenção"""
-        if not self.hold_times:
-            return 0
-        return sum(times.get('hold', 0) for times in self.hold_times)
+        return sum(session_round.hold_seconds for session_round in self.round_list)
 
     @property
     def average_hold_time(self):
         """Retorna o tempo médio de retenção"""
-        if not self.hold_times:
-            return 0
-        hold_times = [times.get('hold', 0) for times in self.hold_times if times.get('hold', 0) > 0]
+        hold_times = [
+            session_round.hold_seconds
+            for session_round in self.round_list
+            if session_round.hold_seconds > 0
+        ]
         return sum(hold_times) / len(hold_times) if hold_times else 0
 
 
+class SessionRound(models.Model):
+    """Tempos de retenção e recuperação de um round da sessão"""
+    session = models.ForeignKey(BreathingSession, on_delete=models.CASCADE, related_name='round_times')
+    round_number = models.PositiveIntegerField(help_text="Número do round (a partir de 1)")
+    hold_seconds = models.PositiveIntegerField(default=0, help_text="Tempo de retenção em segundos")
+    recovery_seconds = models.PositiveIntegerField(default=0, help_text="Tempo de recuperação em segundos")
+
+    class Meta:
+        unique_together = ('session', 'round_number')
+        verbose_name = "Round da Sessão"
+        verbose_name_plural = "Rounds das Sessões"
+        ordering = ['round_number']
+
+    def __str__(self):
+        return f"Round {self.round_number} - {self.session}"
+
+
 class SessionStats(models.Model):
     """Estatísticas detalhadas de uma sessão"""
     session = models.OneToOneField(BreathingSession, on_delete=models.CASCADE, related_name='stats')
@@ -223,4 +419,452 @@ class SessionStats(models.Model):
         verbose_name_plural = "Estatísticas das Sessões"
 
     def __str__(self):
-        return f"Stats - {self.session}"
\ No newline at end of file
+        return f"Stats - {self.session}"
+
+class DailySessionRollup(models.Model):
+    """Resumo diário das sessões de um usuário (mantido incrementalmente)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField(help_text="Dia (fuso local) em que as sessões começaram")
+    session_count = models.PositiveIntegerField(default=0, help_text="Sessões concluídas no dia")
+    breathing_time = models.DurationField(default=timezone.timedelta(0))
+    hold_count = models.PositiveIntegerField(default=0, help_text="Retenções registradas no dia")
+    total_hold_seconds = models.PositiveIntegerField(default=0)
+    best_hold_seconds = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'day')
+        verbose_name = "Resumo Diário"
+        verbose_name_plural = "Resumos Diários"
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"Resumo de {self.user.username} - {self.day.strftime('%d/%m/%Y')}"
+
+    @staticmethod
+    def day_range(day):
+        """Início e fim (fuso local) do dia, para filtrar started_at pelo índice"""
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        return start, start + timezone.timedelta(days=1)
+
+    @classmethod
+    def _bump(cls, session, **changes):
+        """Aplica incrementos atômicos na linha do dia da sessão (um único UPDATE)"""
+        day = timezone.localdate(session.started_at)
+        rollups = cls.objects.filter(user_id=session.user_id, day=day)
+        changes['updated_at'] = timezone.now()
+        if rollups.update(**changes):
+            return
+        # Primeiro evento do dia: cria a linha zerada (ou usa a criada por
+        # uma requisição concorrente) e aplica os incrementos sobre ela
+        cls.objects.bulk_create([cls(user_id=session.user_id, day=day)], ignore_conflicts=True)
+        rollups.update(**changes)
+
+    @classmethod
+    def record_completion(cls, session):
+        """Contabiliza uma sessão concluída"""
+        cls._bump(
+            session,
+            session_count=F('session_count') + 1,
+            breathing_time=F('breathing_time') + session.actual_duration,
+        )
+        LeaderboardScore.record_completion(session)
+
+    @classmethod
+    def _refresh_best(cls, user_id, day, removed_hold):
+        """Relê dos rounds a maior retenção do dia, se ela podia ser a retenção removida"""
+        best = SessionRound.objects.filter(
+            session__user_id=user_id,
+            session__started_at__range=cls.day_range(day),
+        ).order_by().values('session__user_id').annotate(best=Max('hold_seconds')).values('best')
+        cls.objects.filter(
+            user_id=user_id, day=day, best_hold_seconds__lte=removed_hold
+        ).update(best_hold_seconds=Coalesce(Subquery(best), 0))
+
+    @classmethod
+    def record_hold(cls, session, hold_seconds, previous_hold=0):
+        """Contabiliza (ou corrige) o tempo de retenção de um round (já gravado em SessionRound)"""
+        hold_seconds = int(hold_seconds or 0)
+        previous_hold = int(previous_hold or 0)
+        lowered = hold_seconds < previous_hold
+        changes = {'total_hold_seconds': F('total_hold_seconds') + (hold_seconds - previous_hold)}
+        if not lowered:
+            changes['best_hold_seconds'] = Greatest('best_hold_seconds', Value(hold_seconds))
+        if hold_seconds > 0 and previous_hold <= 0:
+            changes['hold_count'] = F('hold_count') + 1
+        elif hold_seconds <= 0 and previous_hold > 0:
+            changes['hold_count'] = F('hold_count') - 1
+        cls._bump(session, **changes)
+        if not lowered:
+            LeaderboardScore.record_hold(session, hold_seconds)
+            return
+
+        # Correção para menos: a maior retenção pode ter sido a antiga
+        day = timezone.localdate(session.started_at)
+        cls._refresh_best(session.user_id, day, previous_hold)
+        LeaderboardScore.refresh_best(session.user_id, day)
+
+    @classmethod
+    def record_removal(cls, session, hold_seconds):
+        """Desconta uma sessão apagada (e as retenções dos seus rounds) do resumo do dia"""
+        holds = [hold for hold in hold_seconds if hold > 0]
+        changes = {}
+        if session.status == 'completed':
+            changes['session_count'] = F('session_count') - 1
+            changes['breathing_time'] = F('breathing_time') - (
+                session.actual_duration or timezone.timedelta(0)
+            )
+        if holds:
+            changes['hold_count'] = F('hold_count') - len(holds)
+            changes['total_hold_seconds'] = F('total_hold_seconds') - sum(holds)
+        if not changes:
+            return
+
+        day = timezone.localdate(session.started_at)
+        cls.objects.filter(user_id=session.user_id, day=day).update(updated_at=timezone.now(), **changes)
+        if holds:
+            # A maior retenção só é recalculada se era da sessão apagada
+            cls._refresh_best(session.user_id, day, max(holds))
+        LeaderboardScore.record_removal(session, day, changed_best=bool(holds))
+
+    @classmethod
+    def rebuild(cls, user_ids=None, batch_size=1000):
+        """Recalcula os resumos a partir das sessões, em lote"""
+        sessions = BreathingSession.objects.all()
+        if user_ids is not None:
+            sessions = sessions.filter(user_id__in=user_ids)
+
+        rows = {}
+        completed = sessions.annotate(
+            day=TruncDate('started_at')
+        ).values('user_id', 'day').annotate(
+            session_count=Count('id', filter=Q(status='completed')),
+            breathing_time=Sum('actual_duration', filter=Q(status='completed')),
+        ).order_by()
+        for item in completed:
+            rows[(item['user_id'], item['day'])] = cls(
+                user_id=item['user_id'],
+                day=item['day'],
+                session_count=item['session_count'],
+                breathing_time=item['breathing_time'] or timezone.timedelta(0),
+            )
+
+        holds = SessionRound.objects.filter(
+            session__in=sessions, hold_seconds__gt=0
+        ).annotate(
+            day=TruncDate('session__started_at')
+        ).values('session__user_id', 'day').annotate(
+            hold_count=Count('id'),
+            total_hold_seconds=Sum('hold_seconds'),
+            best_hold_seconds=Max('hold_seconds'),
+        ).order_by()
+        for item in holds:
+            rollup = rows[(item['session__user_id'], item['day'])]
+            rollup.hold_count = item['hold_count']
+            rollup.total_hold_seconds = item['total_hold_seconds']
+            rollup.best_hold_seconds = item['best_hold_seconds']
+
+        with transaction.atomic():
+            existing = cls.objects.all()
+            if user_ids is not None:
+                existing = existing.filter(user_id__in=user_ids)
+            existing.delete()
+            cls.objects.bulk_create(rows.values(), batch_size=batch_size)
+            LeaderboardScore.rebuild(user_ids=user_ids, batch_size=batch_size)
+        return len(rows)
+
+
+class LeaderboardScore(models.Model):
+    """Totais de um usuário em um período (semana ISO ou todo o histórico)"""
+    # Mantidos incrementalmente junto com os resumos diários. O ranking entre
+    # amigos lê uma linha por amigo pelo índice único (period, user) e ordena
+    # apenas essas linhas, sem percorrer as sessões.
+    ALL_TIME = 'all'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_scores')
+    period = models.CharField(max_length=8, help_text="'all' ou semana ISO no formato 2026-W01")
+    session_count = models.PositiveIntegerField(default=0)
+    breathing_time = models.DurationField(default=timezone.timedelta(0))
+    best_hold_seconds = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('period', 'user')
+        verbose_name = "Pontuação do Ranking"
+        verbose_name_plural = "Pontuações do Ranking"
+
+    def __str__(self):
+        return f"Ranking de {self.user.username} - {self.period}"
+
+    @staticmethod
+    def week_period(day):
+        """Identificador da semana ISO do dia (ex.: 2026-W07)"""
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+
+    @classmethod
+    def periods_for(cls, session):
+        return [cls.ALL_TIME, cls.week_period(timezone.localdate(session.started_at))]
+
+    @classmethod
+    def _bump(cls, session, **changes):
+        """Aplica incrementos atômicos nas linhas da semana e do histórico (um único UPDATE)"""
+        periods = cls.periods_for(session)
+        scores = cls.objects.filter(user_id=session.user_id)
+        changes['updated_at'] = now = timezone.now()
+        if scores.filter(period__in=periods).update(**changes) == len(periods):
+            return
+        # Alguma linha ainda não existia. As atualizadas acima ficam bloqueadas
+        # até o commit com este updated_at; as demais são criadas e atualizadas
+        updated = set(scores.filter(period__in=periods, updated_at=now).values_list('period', flat=True))
+        missing = [period for period in periods if period not in updated]
+        cls.objects.bulk_create(
+            [cls(user_id=session.user_id, period=period) for period in missing],
+            ignore_conflicts=True,
+        )
+        scores.filter(period__in=missing).update(**changes)
+
+    @classmethod
+    def record_completion(cls, session):
+        """Contabiliza uma sessão concluída"""
+        cls._bump(
+            session,
+            session_count=F('session_count') + 1,
+            breathing_time=F('breathing_time') + session.actual_duration,
+        )
+
+    @classmethod
+    def record_hold(cls, session, hold_seconds):
+        """Atualiza a maior retenção com um novo tempo"""
+        cls._bump(session, best_hold_seconds=Greatest('best_hold_seconds', Value(int(hold_seconds or 0))))
+
+    @classmethod
+    def record_removal(cls, session, day, changed_best=False):
+        """Desconta uma sessão apagada; a maior retenção é relida dos resumos diários"""
+        scores = cls.objects.filter(user_id=session.user_id)
+        if session.status == 'completed':
+            scores.filter(period__in=cls.periods_for(session)).update(
+                session_count=F('session_count') - 1,
+                breathing_time=F('breathing_time') - (session.actual_duration or timezone.timedelta(0)),
+                updated_at=timezone.now(),
+            )
+        if changed_best:
+            cls.refresh_best(session.user_id, day)
+
+    @classmethod
+    def refresh_best(cls, user_id, day):
+        """Relê dos resumos diários a maior retenção da semana do dia e do histórico"""
+        scores = cls.objects.filter(user_id=user_id)
+        rollups = DailySessionRollup.objects.filter(user_id=user_id).order_by()
+        monday = day - timezone.timedelta(days=day.weekday())
+        for period, period_rollups in (
+            (cls.ALL_TIME, rollups),
+            (cls.week_period(day), rollups.filter(day__range=(monday, monday + timezone.timedelta(days=6)))),
+        ):
+            best = period_rollups.values('user_id').annotate(best=Max('best_hold_seconds')).values('best')
+            scores.filter(period=period).update(best_hold_seconds=Coalesce(Subquery(best), 0))
+
+    @classmethod
+    def rebuild(cls, user_ids=None, batch_size=1000):
+        """Recalcula as pontuações a partir dos resumos diários"""
+        rollups = DailySessionRollup.objects.all()
+        if user_ids is not None:
+            rollups = rollups.filter(user_id__in=user_ids)
+
+        rows = {}
+        for rollup in rollups.order_by().iterator(chunk_size=batch_size):
+            for period in (cls.ALL_TIME, cls.week_period(rollup.day)):
+                score = rows.get((rollup.user_id, period))
+                if score is None:
+                    score = rows[(rollup.user_id, period)] = cls(user_id=rollup.user_id, period=period)
+                score.session_count += rollup.session_count
+                score.breathing_time += rollup.breathing_time
+                score.best_hold_seconds = max(score.best_hold_seconds, rollup.best_hold_seconds)
+
+        with transaction.atomic():
+            existing = cls.objects.all()
+            if user_ids is not None:
+                existing = existing.filter(user_id__in=user_ids)
+            existing.delete()
+            cls.objects.bulk_create(rows.values(), batch_size=batch_size)
+        return len(rows)
+
+
+class FeedEntry(models.Model):
+    """Sessão concluída por um amigo, na linha do tempo (feed) de um usuário"""
+    # Gravada para cada amigo no momento da conclusão (fan-out na escrita),
+    # com os dados exibidos copiados da sessão: o feed é uma leitura indexada
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed_entries',
+        help_text="Dono da linha do tempo"
+    )
+    actor = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        help_text="Amigo que concluiu a sessão"
+    )
+    session = models.ForeignKey(BreathingSession, on_delete=models.CASCADE, related_name='feed_entries')
+    rounds = models.PositiveIntegerField()
+    started_at = models.DateTimeField()
+    completed_at = models.DateTimeField()
+    actual_duration = models.DurationField(null=True, blank=True)
+    total_hold_seconds = models.PositiveIntegerField(default=0)
+
+    # Sessões anteriores copiadas para o feed quando uma amizade é aceita
+    BACKFILL_SESSIONS = 50
+
+    class Meta:
+        unique_together = ('owner', 'session')
+        verbose_name = "Entrada do Feed"
+        verbose_name_plural = "Entradas do Feed"
+        ordering = ['-completed_at', '-id']
+        indexes = [
+            models.Index(fields=['owner', '-completed_at', '-id'], name='feed_owner_idx'),
+            models.Index(fields=['owner', 'actor', '-completed_at'], name='feed_owner_actor_idx'),
+        ]
+
+    def __str__(self):
+        return f"Feed de {self.owner.username} - {self.session}"
+
+    @classmethod
+    def _for_session(cls, owner_id, session, total_hold_seconds):
+        return cls(
+            owner_id=owner_id,
+            actor_id=session.user_id,
+            session_id=session.pk,
+            rounds=session.rounds,
+            started_at=session.started_at,
+            completed_at=session.completed_at,
+            actual_duration=session.actual_duration,
+            total_hold_seconds=total_hold_seconds or 0,
+        )
+
+    @classmethod
+    def fan_out(cls, session):
+        """Grava a sessão concluída na linha do tempo de cada amigo aceito"""
+        # Escrita: amigos lidos do banco, não do grafo em cache
+        friend_ids = Friendship.friend_ids(session.user_id, cached=False)
+        if not friend_ids:
+            return 0
+
+        cls.objects.bulk_create(
+            [cls._for_session(friend_id, session, session.total_hold_time) for friend_id in friend_ids],
+            ignore_conflicts=True,
+        )
+        return len(friend_ids)
+
+    @classmethod
+    def backfill(cls, owner_id, actor_id, limit=None):
+        """Copia as sessões concluídas mais recentes de actor para o feed de owner"""
+        sessions = BreathingSession.objects.filter(
+            user_id=actor_id, status='completed', completed_at__isnull=False
+        ).annotate(
+            total_hold=Sum('round_times__hold_seconds')
+        ).order_by('-completed_at')[:limit or cls.BACKFILL_SESSIONS]
+        entries = [cls._for_session(owner_id, session, session.total_hold) for session in sessions]
+        cls.objects.bulk_create(entries, ignore_conflicts=True)
+        return len(entries)
+
+    @classmethod
+    def sync_friendship(cls, friendship, previous_status):
+        """Mantém os feeds do par coerentes com a mudança de status da amizade"""
+        user_ids = (friendship.requester_id, friendship.addressee_id)
+        current_status = friendship.status if friendship.pk else None
+        if current_status == 'accepted' and previous_status != 'accepted':
+            cls.backfill(*user_ids)
+            cls.backfill(*reversed(user_ids))
+        elif previous_status == 'accepted' and current_status != 'accepted':
+            cls.objects.filter(
+                Q(owner_id=user_ids[0], actor_id=user_ids[1])
+                | Q(owner_id=user_ids[1], actor_id=user_ids[0])
+            ).delete()
+
+
+class UserSearchTerm(models.Model):
+    """Username normalizado (minúsculas, sem acentos) para busca por prefixo"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='search_term'
+    )
+    term = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        verbose_name = "Termo de Busca"
+        verbose_name_plural = "Termos de Busca"
+
+    def __str__(self):
+        return self.term
+
+
+class UserSearchTrigram(models.Model):
+    """Trigrama do username de um usuário, para busca aproximada"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        # O índice único (trigram, user) atende a busca por trigrama
+        unique_together = ('trigram', 'user')
+        verbose_name = "Trigrama de Busca"
+        verbose_name_plural = "Trigramas de Busca"
+
+    def __str__(self):
+        return f"{self.trigram} - {self.user_id}"
+
+
+class RefreshTokenRecord(models.Model):
+    """Refresh token emitido: só o jti e a validade; revogado quando é rotacionado"""
+    jti = models.UUIDField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Refresh Token"
+        verbose_name_plural = "Refresh Tokens"
+
+    def __str__(self):
+        return f"{self.jti} - {self.user_id}"
+
+    @classmethod
+    def _for_token(cls, token, user_id, **fields):
+        return cls(
+            jti=token['jti'],
+            user_id=user_id,
+            expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+            **fields
+        )
+
+    @classmethod
+    def record(cls, token, user_id):
+        """Registra um refresh token recém-emitido"""
+        record = cls._for_token(token, user_id)
+        record.save(force_insert=True)
+        return record
+
+    @classmethod
+    def consume(cls, token, user_id):
+        """Revoga o token para rotacioná-lo; False se ele já foi usado"""
+        now = timezone.now()
+        if cls.objects.filter(pk=token['jti'], revoked_at__isnull=True).update(revoked_at=now):
+            return True
+        if cls.objects.filter(pk=token['jti']).exists():
+            return False
+
+        # Token emitido antes do registro existir: vale uma única vez
+        try:
+            with transaction.atomic():
+                cls._for_token(token, user_id, revoked_at=now).save(force_insert=True)
+        except IntegrityError:
+            return False
+        return True
+
+    @classmethod
+    def prune(cls, batch_size=5000, now=None):
+        """Apaga os tokens vencidos em lotes (pela chave primária); retorna o total"""
+        now = now or timezone.now()
+        deleted = 0
+        while True:
+            batch = list(
+                cls.objects.filter(expires_at__lt=now).values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,43 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SessionCursorPagination(CursorPagination):
+    """Paginação por cursor para o histórico de sessões"""
+    ordering = ('-started_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class FriendshipCursorPagination(CursorPagination):
+    """Paginação por cursor para as listas de amizades"""
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class FeedCursorPagination(CursorPagination):
+    """Paginação por cursor para o feed de atividades dos amigos"""
+    ordering = ('-completed_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OptInCursorPaginationMixin:
+    """Usa cursor_pagination_class quando a requisição traz ?pagination=cursor"""
+    cursor_pagination_class = None
+
+    def use_cursor_pagination(self):
+        return (
+            self.cursor_pagination_class is not None
+            and self.request is not None
+            and self.request.query_params.get('pagination') == 'cursor'
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
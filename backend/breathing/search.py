@@ -0,0 +1,179 @@
+import math
+import unicodedata
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import get_cache
+from .models import Friendship, UserSearchTerm, UserSearchTrigram
+
+# Número máximo de resultados por busca
+SEARCH_LIMIT = 10
+# Fração mínima dos trigramas da consulta presentes no username (busca aproximada)
+MIN_TRIGRAM_OVERLAP = 0.5
+# Máximo de entradas do índice de trigramas lidas por busca aproximada
+FUZZY_POSTINGS_BUDGET = 5000
+# Validade (s) dos tamanhos das listas de trigramas em cache
+TRIGRAM_SIZE_TIMEOUT = 3600
+# Maior código unicode: limite superior do intervalo da busca por prefixo
+_PREFIX_END = '\U0010ffff'
+
+# Ordem dos resultados: amigos, solicitações pendentes e depois os demais
+RELATIONSHIP_TIERS = {'friend': 0, 'pending_sent': 1, 'pending_received': 1, None: 2}
+
+
+def normalize_term(value):
+    """Minúsculas e sem acentos: 'João' -> 'joao'"""
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in value if not unicodedata.combining(char)).strip().lower()
+
+
+def trigrams(term):
+    """Trigramas do termo, com um espaço nas bordas para valorizar início e fim"""
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_users(users, batch_size=1000):
+    """Grava (ou regrava) as entradas de busca dos usuários informados"""
+    users = list(users)
+    if not users:
+        return 0
+
+    user_ids = [user.pk for user in users]
+    with transaction.atomic():
+        UserSearchTrigram.objects.filter(user_id__in=user_ids).delete()
+        UserSearchTerm.objects.bulk_create(
+            [UserSearchTerm(user_id=user.pk, term=normalize_term(user.username)) for user in users],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['term'],
+            batch_size=batch_size,
+        )
+        UserSearchTrigram.objects.bulk_create(
+            [
+                UserSearchTrigram(user_id=user.pk, trigram=trigram)
+                for user in users
+                for trigram in trigrams(normalize_term(user.username))
+            ],
+            batch_size=batch_size,
+        )
+    return len(users)
+
+
+def index_user(user):
+    """Atualiza a entrada de busca do usuário se o username mudou"""
+    current = UserSearchTerm.objects.filter(user_id=user.pk).values_list('term', flat=True).first()
+    if current != normalize_term(user.username):
+        index_users([user])
+
+
+def relationships(user_id):
+    """Relação do usuário com cada pessoa com quem tem amizade ou solicitação pendente"""
+    graph = Friendship.graph(user_id)
+    related = dict.fromkeys(graph['pending_in'], 'pending_received')
+    related.update(dict.fromkeys(graph['pending_out'], 'pending_sent'))
+    related.update(dict.fromkeys(graph['accepted'], 'friend'))
+    return related
+
+
+def _match(term, candidate):
+    """(tipo de correspondência, similaridade) ou None se o candidato não corresponde"""
+    if candidate == term:
+        return 0, 1.0
+    if candidate.startswith(term):
+        return 1, 1.0
+    if term in candidate:
+        return 2, 1.0
+    query_grams = trigrams(term)
+    similarity = len(query_grams & trigrams(candidate)) / len(query_grams)
+    if len(term) >= 3 and similarity >= MIN_TRIGRAM_OVERLAP:
+        return 3, similarity
+    return None
+
+
+def _posting_sizes(grams):
+    """Usuários por trigrama (limitado ao orçamento), cacheado: varia pouco entre buscas"""
+    cache = get_cache()
+    keys = {gram: f'breathing:trigram_size:{gram.encode().hex()}' for gram in grams}
+    cached = cache.get_many(keys.values())
+    sizes = {gram: cached[key] for gram, key in keys.items() if key in cached}
+
+    missing = {
+        gram: UserSearchTrigram.objects.filter(trigram=gram)[:FUZZY_POSTINGS_BUDGET + 1].count()
+        for gram in grams if gram not in sizes
+    }
+    if missing:
+        cache.set_many({keys[gram]: size for gram, size in missing.items()}, TRIGRAM_SIZE_TIMEOUT)
+        sizes.update(missing)
+    return sizes
+
+
+def _fuzzy_candidates(term, limit):
+    """Ids dos usuários com mais trigramas em comum com o termo (a conferir com _match)"""
+    query_grams = trigrams(term)
+    needed = max(1, math.ceil(len(query_grams) * MIN_TRIGRAM_OVERLAP))
+
+    # Quem atinge o mínimo tem ao menos um dos (n - needed + 1) trigramas mais
+    # raros da consulta. As listas são lidas dos mais raros para os mais comuns
+    # pelo índice (trigram, user), até FUZZY_POSTINGS_BUDGET usuários no total.
+    sizes = _posting_sizes(query_grams)
+    by_rarity = sorted(query_grams, key=sizes.get)
+    required = by_rarity[:len(query_grams) - needed + 1]
+    if sum(sizes[gram] for gram in required) > FUZZY_POSTINGS_BUDGET:
+        return []
+
+    grams, budget = [], FUZZY_POSTINGS_BUDGET
+    for gram in by_rarity:
+        if sizes[gram] > budget:
+            break
+        grams.append(gram)
+        budget -= sizes[gram]
+
+    hits = Counter(
+        UserSearchTrigram.objects.filter(trigram__in=grams).values_list('user_id', flat=True)
+    )
+    return [user_id for user_id, count in hits.most_common(limit)]
+
+
+def search_users(user, query, limit=SEARCH_LIMIT):
+    """Busca por prefixo e trigramas; retorna (usuários, relação de cada um com quem buscou)"""
+    term = normalize_term(query)
+    if not term:
+        return [], {}
+
+    related = relationships(user.id)
+    candidates = {}
+
+    def consider(user_id, candidate_term):
+        if user_id != user.id and user_id not in candidates:
+            match = _match(term, candidate_term)
+            if match is not None:
+                candidates[user_id] = (
+                    RELATIONSHIP_TIERS[related.get(user_id)], match[0], -match[1], candidate_term
+                )
+
+    # Amigos e pendentes: conjunto pequeno, comparado em memória
+    if related:
+        for user_id, candidate_term in UserSearchTerm.objects.filter(
+            user_id__in=related
+        ).values_list('user_id', 'term'):
+            consider(user_id, candidate_term)
+
+    # Prefixo: varredura de intervalo no índice de term
+    for user_id, candidate_term in UserSearchTerm.objects.filter(
+        term__gte=term, term__lt=term + _PREFIX_END
+    ).order_by('term').values_list('user_id', 'term')[:limit]:
+        consider(user_id, candidate_term)
+
+    # Aproximada: apenas quando o prefixo não preencheu os resultados
+    if len(candidates) < limit and len(term) >= 3:
+        for user_id, candidate_term in UserSearchTerm.objects.filter(
+            user_id__in=_fuzzy_candidates(term, limit * 3)
+        ).values_list('user_id', 'term'):
+            consider(user_id, candidate_term)
+
+    ranked = sorted(candidates, key=candidates.get)[:limit]
+    users = User.objects.in_bulk(ranked)
+    return [users[user_id] for user_id in ranked if user_id in users], related
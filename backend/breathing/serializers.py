@@ -1,10 +1,23 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from .models import UserProfile, Friendship, BreathingSession, SessionStats
-
-
-class UserSerializer(serializers.ModelSerializer):
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import (
+    UserProfile, Friendship, BreathingSession, SessionStats, DailySessionRollup, FeedEntry,
+    RefreshTokenRecord
+)
+from .authentication import BreathingRefreshToken, password_check_limiter
+from .metrics import TimedSerializerMixin
+from .transitions import MAX_BATCH_EVENTS, MAX_PHASE_SECONDS
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para o modelo User"""
     class Meta:
         model = User
@@ -12,7 +25,18 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_joined']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserSearchSerializer(UserSerializer):
+    """Resultado da busca de usuários, com a relação de amizade com quem buscou"""
+    relationship = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['relationship']
+
+    def get_relationship(self, obj):
+        return self.context.get('relationships', {}).get(obj.id)
+
+
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para o perfil do usuário"""
     user = UserSerializer(read_only=True)
     total_breathing_time_formatted = serializers.SerializerMethodField()
@@ -37,7 +61,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return "0h 0m 0s"
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para registro de usuário"""
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
@@ -59,7 +83,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class LoginSerializer(serializers.Serializer):
+class LoginSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer para login"""
     username = serializers.CharField()
     password = serializers.CharField()
@@ -69,7 +93,9 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if username and password:
-            user = authenticate(username=username, password=password)
+            # Verificação de senha (e atualização do hash) com concorrência limitada
+            with password_check_limiter.slot('LoginView.post'):
+                user = authenticate(username=username, password=password)
             if not user:
                 raise serializers.ValidationError('Credenciais inválidas.')
             if not user.is_active:
@@ -80,7 +106,28 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Deve incluir "username" e "password".')
 
 
-class FriendshipSerializer(serializers.ModelSerializer):
+class TokenRefreshSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Rotação do refresh token (SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER'])"""
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = BreathingRefreshToken(attrs['refresh'])
+        user = User.objects.filter(
+            pk=refresh.get(jwt_settings.USER_ID_CLAIM)
+        ).only('id', 'username', 'is_active').first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('Usuário inativo ou inexistente', code='user_inactive')
+
+        # O token enviado é revogado e o novo já sai com username/is_active atuais
+        with transaction.atomic():
+            if not RefreshTokenRecord.consume(refresh, user.pk):
+                raise InvalidToken('Refresh token já utilizado')
+            new_refresh = BreathingRefreshToken.for_user(user)
+        return {'access': str(new_refresh.access_token), 'refresh': str(new_refresh)}
+
+
+class FriendshipSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para amizades"""
     requester = UserSerializer(read_only=True)
     addressee = UserSerializer(read_only=True)
@@ -92,7 +139,8 @@ class FriendshipSerializer(serializers.ModelSerializer):
             'id', 'requester', 'addressee', 'addressee_username', 
             'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'requester', 'created_at', 'updated_at']
+        # status muda apenas pelas ações accept/reject, feitas pelo destinatário
+        read_only_fields = ['id', 'requester', 'status', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         addressee_username = validated_data.pop('addressee_username', None)
@@ -107,23 +155,37 @@ class FriendshipSerializer(serializers.ModelSerializer):
         requester = self.context['request'].user
         addressee = validated_data['addressee']
         
-        if requester == addressee:
+        if requester.id == addressee.id:
             raise serializers.ValidationError("Você não pode enviar solicitação de amizade para si mesmo.")
         
-        existing_friendship = Friendship.objects.filter(
-            requester=requester, addressee=addressee
-        ).first() or Friendship.objects.filter(
-            requester=addressee, addressee=requester
-        ).first()
-        
-        if existing_friendship:
-            raise serializers.ValidationError("Já existe uma solicitação de amizade entre estes usuários.")
+        existing = Friendship.between(requester.id, addressee.id)
+        if existing:
+            return self.resolve_existing(existing, requester)
         
-        validated_data['requester'] = requester
-        return super().create(validated_data)
+        validated_data['requester_id'] = requester.id
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            # Outra requisição criou o par entre a verificação e o INSERT
+            return self.resolve_existing(Friendship.between(requester.id, addressee.id), requester)
+
+    def resolve_existing(self, existing, requester):
+        """Solicitações cruzadas (o outro já pediu) viram amizade; o resto é duplicata"""
+        if existing.status == 'pending' and existing.addressee_id == requester.id:
+            accepted = Friendship.objects.filter(pk=existing.pk, status='pending').update(
+                status='accepted', updated_at=timezone.now()
+            )
+            existing.refresh_from_db()
+            if accepted:
+                existing.invalidate_graphs()
+                FeedEntry.sync_friendship(existing, 'pending')
+            if existing.status == 'accepted':
+                return existing
+        raise serializers.ValidationError("Já existe uma solicitação de amizade entre estes usuários.")
 
 
-class SessionStatsSerializer(serializers.ModelSerializer):
+class SessionStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para estatísticas da sessão"""
     class Meta:
         model = SessionStats
@@ -134,11 +196,18 @@ class SessionStatsSerializer(serializers.ModelSerializer):
         ]
 
 
-class BreathingSessionSerializer(serializers.ModelSerializer):
-    """Serializer para sessões de respiração"""
+class HoldTimeSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Tempos de um round em hold_times"""
+    hold = serializers.IntegerField(min_value=0, max_value=MAX_PHASE_SECONDS, default=0)
+    recovery = serializers.IntegerField(min_value=0, max_value=MAX_PHASE_SECONDS, default=0)
+
+
+class BreathingSessionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer para sessões de respiração (aceita `fields` para respostas parciais)"""
     user = UserSerializer(read_only=True)
     stats = SessionStatsSerializer(required=False)
     duration_formatted = serializers.ReadOnlyField()
+    hold_times = HoldTimeSerializer(many=True, required=False)
     planned_duration_formatted = serializers.SerializerMethodField()
     actual_duration_formatted = serializers.SerializerMethodField()
     hold_times_formatted = serializers.SerializerMethodField()
@@ -154,11 +223,50 @@ class BreathingSessionSerializer(serializers.ModelSerializer):
             'status', 'notes', 'stats', 'hold_times', 'hold_times_formatted',
             'total_hold_time_formatted', 'average_hold_time_formatted'
         ]
+        # status e completed_at mudam apenas pelas ações de transição e por /events/
         read_only_fields = [
             'id', 'user', 'started_at', 'completed_at', 
-            'actual_duration', 'planned_duration'
+            'actual_duration', 'planned_duration', 'status'
         ]
 
+    # Representação resumida usada por ?view=summary
+    SUMMARY_FIELDS = [
+        'id', 'rounds', 'started_at', 'completed_at', 'actual_duration',
+        'duration_formatted', 'status'
+    ]
+    # Campos que dependem de objetos relacionados (select_related/prefetch)
+    RELATED_FIELDS = {
+        'user': 'user',
+        'stats': 'stats',
+        'hold_times': 'round_times',
+        'hold_times_formatted': 'round_times',
+        'total_hold_time_formatted': 'round_times',
+        'average_hold_time_formatted': 'round_times',
+    }
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def fields_from_request(cls, request):
+        """Lê ?view=summary ou ?fields=a,b da requisição (None = todos os campos; nomes desconhecidos geram 400)"""
+        if request is None:
+            return None
+        if request.query_params.get('view') == 'summary':
+            return list(cls.SUMMARY_FIELDS)
+        requested = request.query_params.get('fields')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            invalid = [name for name in names if name not in cls.Meta.fields]
+            if invalid:
+                raise serializers.ValidationError({'fields': f'Campos inválidos: {", ".join(invalid)}'})
+            return names or None
+        return None
+
     def get_planned_duration_formatted(self, obj):
         if obj.planned_duration:
             total_seconds = int(obj.planned_duration.total_seconds())
@@ -196,7 +304,7 @@ class BreathingSessionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         stats_data = validated_data.pop('stats', None)
-        validated_data['user'] = self.context['request'].user
+        validated_data['user_id'] = self.context['request'].user.id
         session = super().create(validated_data)
         
         if stats_data:
@@ -204,9 +312,20 @@ class BreathingSessionSerializer(serializers.ModelSerializer):
         
         return session
 
+    def validate(self, attrs):
+        hold_times = attrs.get('hold_times')
+        rounds = attrs.get('rounds', self.instance.rounds if self.instance else None)
+        if hold_times is not None and rounds is not None and len(hold_times) > rounds:
+            raise serializers.ValidationError({'hold_times': f'No máximo {rounds} rounds.'})
+        return attrs
+
     def update(self, instance, validated_data):
         stats_data = validated_data.pop('stats', None)
+        hold_times = validated_data.pop('hold_times', None)
         session = super().update(instance, validated_data)
+        if hold_times is not None:
+            # Os rounds vivem em SessionRound: a lista é gravada lá, com os resumos
+            session.replace_hold_times(hold_times)
         
         if stats_data:
             stats, created = SessionStats.objects.get_or_create(
@@ -221,7 +340,26 @@ class BreathingSessionSerializer(serializers.ModelSerializer):
         return session
 
 
-class BreathingSessionCreateSerializer(serializers.ModelSerializer):
+class SessionEventSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Serializer para um evento de fase registrado pelo cliente"""
+    ACTION_CHOICES = [
+        'start_hold', 'end_hold', 'start_recovery', 'end_recovery',
+        'next_round', 'cancel', 'complete'
+    ]
+
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    at = serializers.DateTimeField()
+    round_number = serializers.IntegerField(min_value=1, required=False)
+    hold_seconds = serializers.IntegerField(min_value=0, required=False)
+    recovery_seconds = serializers.IntegerField(min_value=0, required=False)
+
+
+class SessionEventBatchSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Serializer para um lote ordenado de eventos de fase"""
+    events = SessionEventSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_EVENTS)
+
+
+class BreathingSessionCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer simplificado para criação de sessões"""
     class Meta:
         model = BreathingSession
@@ -229,11 +367,11 @@ class BreathingSessionCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'status', 'started_at']
 
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
+        validated_data['user_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 
-class BreathingSessionStatsSerializer(serializers.ModelSerializer):
+class BreathingSessionStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer para estatísticas resumidas das sessões do usuário"""
     total_sessions = serializers.SerializerMethodField()
     total_time = serializers.SerializerMethodField()
@@ -248,40 +386,100 @@ class BreathingSessionStatsSerializer(serializers.ModelSerializer):
             'sessions_this_week', 'sessions_this_month'
         ]
 
+    def get_summary(self, obj):
+        """Calcula todas as estatísticas em uma única agregação sobre os resumos diários"""
+        cache = getattr(self, '_summary_cache', None)
+        if cache is None:
+            cache = self._summary_cache = {}
+        if obj.pk not in cache:
+            today = timezone.localdate()
+            week_start = today - timedelta(days=6)
+            month_start = today - timedelta(days=29)
+            summary = DailySessionRollup.objects.filter(user_id=obj.pk).aggregate(
+                total_sessions=Sum('session_count'),
+                total_time=Sum('breathing_time'),
+                sessions_this_week=Sum('session_count', filter=Q(day__gte=week_start)),
+                sessions_this_month=Sum('session_count', filter=Q(day__gte=month_start)),
+            )
+            for key in ('total_sessions', 'sessions_this_week', 'sessions_this_month'):
+                summary[key] = summary[key] or 0
+            summary['average_duration'] = (
+                summary['total_time'] / summary['total_sessions']
+                if summary['total_sessions'] and summary['total_time'] else None
+            )
+            cache[obj.pk] = summary
+        return cache[obj.pk]
+
     def get_total_sessions(self, obj):
-        return obj.breathing_sessions.filter(status='completed').count()
+        return self.get_summary(obj)['total_sessions']
 
     def get_total_time(self, obj):
-        sessions = obj.breathing_sessions.filter(status='completed', actual_duration__isnull=False)
-        total = sum([s.actual_duration.total_seconds() for s in sessions], 0)
+        total_time = self.get_summary(obj)['total_time']
+        total = total_time.total_seconds() if total_time else 0
         hours = int(total // 3600)
         minutes = int((total % 3600) // 60)
         return f"{hours}h {minutes}m"
 
     def get_average_session_duration(self, obj):
-        sessions = obj.breathing_sessions.filter(status='completed', actual_duration__isnull=False)
-        if sessions:
-            total = sum([s.actual_duration.total_seconds() for s in sessions], 0)
-            avg = total / sessions.count()
+        average_duration = self.get_summary(obj)['average_duration']
+        if average_duration:
+            avg = average_duration.total_seconds()
             minutes = int(avg // 60)
             seconds = int(avg % 60)
             return f"{minutes}m {seconds}s"
         return "0m 0s"
 
     def get_sessions_this_week(self, obj):
-        from django.utils import timezone
-        from datetime import timedelta
-        week_ago = timezone.now() - timedelta(days=7)
-        return obj.breathing_sessions.filter(
-            status='completed', 
-            completed_at__gte=week_ago
-        ).count()
+        return self.get_summary(obj)['sessions_this_week']
 
     def get_sessions_this_month(self, obj):
-        from django.utils import timezone
-        from datetime import timedelta
-        month_ago = timezone.now() - timedelta(days=30)
-        return obj.breathing_sessions.filter(
-            status='completed', 
-            completed_at__gte=month_ago
-        ).count()
+        return self.get_summary(obj)['sessions_this_month']
+
+
+class DailySessionRollupSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer para o histórico diário de sessões"""
+    breathing_time_formatted = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DailySessionRollup
+        fields = [
+            'day', 'session_count', 'breathing_time', 'breathing_time_formatted',
+            'hold_count', 'total_hold_seconds', 'best_hold_seconds'
+        ]
+
+    def get_breathing_time_formatted(self, obj):
+        total_seconds = int(obj.breathing_time.total_seconds())
+        minutes = total_seconds // 60
+        seconds = total_seconds % 60
+        return f"{minutes}m {seconds}s"
+
+
+class FeedEntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer para as entradas do feed de atividades dos amigos"""
+    actor = UserSerializer(read_only=True)
+    actual_duration_formatted = serializers.SerializerMethodField()
+    total_hold_time_formatted = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FeedEntry
+        fields = [
+            'id', 'actor', 'session', 'rounds', 'started_at', 'completed_at',
+            'actual_duration', 'actual_duration_formatted',
+            'total_hold_seconds', 'total_hold_time_formatted'
+        ]
+
+    def get_actual_duration_formatted(self, obj):
+        if obj.actual_duration:
+            total_seconds = int(obj.actual_duration.total_seconds())
+            minutes = total_seconds // 60
+            seconds = total_seconds % 60
+            return f"{minutes}m {seconds}s"
+        return None
+
+    def get_total_hold_time_formatted(self, obj):
+        total_seconds = obj.total_hold_seconds
+        if total_seconds > 0:
+            minutes = total_seconds // 60
+            seconds = total_seconds % 60
+            return f"{minutes}m {seconds}s"
+        return "0s"
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .metrics import record_query
+from .search import index_user
+
+
+@receiver(post_save, sender=User)
+def update_user_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mantém o índice de busca de usuários em dia com o username"""
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    index_user(instance)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """Mede as queries de cada requisição (o wrapper persiste entre reconexões)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
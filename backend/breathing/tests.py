@@ -1,3 +1,1020 @@
-from django.test import TestCase
+import io
+import json
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+from uuid import UUID
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from .authentication import BreathingRefreshToken, PasswordCheckLimiter
+from .consumers import TOKEN_SUBPROTOCOL
+from .idempotency import get_cache as idempotency_cache, idempotent_response
+from .routing import websocket_urlpatterns
+from .models import (
+    BreathingSession, DailySessionRollup, FeedEntry, Friendship, LeaderboardScore, RefreshTokenRecord,
+    SessionRound, SessionStats, UserProfile, UserSearchTerm, UserSearchTrigram,
+)
+
+
+class QueryCountTests(TestCase):
+    """Garante que as listagens fazem um número constante de queries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='senha-segura-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_sessions(self, count):
+        for _ in range(count):
+            session = BreathingSession.objects.create(user=self.user, rounds=3)
+            session.add_hold_time(1, 60)
+            session.add_hold_time(2, 75)
+            SessionStats.objects.create(session=session, mood_before='calmo')
+
+    def create_friendships(self, count):
+        for _ in range(count):
+            suffix = User.objects.count()
+            friend = User.objects.create_user(f'amigo{suffix}')
+            requester = User.objects.create_user(f'pedido{suffix}')
+            addressee = User.objects.create_user(f'enviado{suffix}')
+            Friendship.objects.create(requester=self.user, addressee=friend, status='accepted')
+            Friendship.objects.create(requester=requester, addressee=self.user)
+            Friendship.objects.create(requester=self.user, addressee=addressee)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context)
+
+    def assertConstantQueries(self, url, populate):
+        populate(1)
+        small = self.count_queries(url)
+        populate(9)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url} executou {large} queries (esperado {small})")
+
+    def test_session_list(self):
+        self.assertConstantQueries('/api/sessions/', self.create_sessions)
+
+    def test_recent_sessions(self):
+        self.assertConstantQueries('/api/sessions/recent/', self.create_sessions)
+
+    def test_active_session(self):
+        self.create_sessions(3)
+        self.assertLessEqual(self.count_queries('/api/sessions/active/'), 3)
+
+    def test_friendship_list(self):
+        self.assertConstantQueries('/api/friendships/', self.create_friendships)
+
+    def test_friends(self):
+        self.assertConstantQueries('/api/friendships/friends/', self.create_friendships)
+
+    def test_pending_requests(self):
+        self.assertConstantQueries('/api/friendships/pending_requests/', self.create_friendships)
+
+    def test_sent_requests(self):
+        self.assertConstantQueries('/api/friendships/sent_requests/', self.create_friendships)
+
+    def count_post_queries(self, url, data=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, data or {}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context)
+
+    def test_phase_transitions(self):
+        UserProfile.objects.create(user=self.user)
+        session = BreathingSession.objects.create(user=self.user, rounds=2)
+        url = f'/api/sessions/{session.pk}/'
+        # O primeiro round cria as linhas do resumo diário e do ranking
+        self.client.post(url + 'next_round/')
+        self.client.post(url + 'start_hold/')
+        self.client.post(url + 'end_hold/', {'round_number': 1, 'hold_seconds': 60}, format='json')
+        self.client.post(url + 'end_recovery/', {'round_number': 1, 'recovery_seconds': 15}, format='json')
+
+        self.assertLessEqual(self.count_post_queries(url + 'next_round/'), 5)
+        self.assertLessEqual(self.count_post_queries(url + 'start_hold/'), 5)
+        self.assertLessEqual(
+            self.count_post_queries(url + 'end_hold/', {'round_number': 2, 'hold_seconds': 80}), 8
+        )
+        self.assertLessEqual(
+            self.count_post_queries(url + 'end_recovery/', {'round_number': 2, 'recovery_seconds': 15}), 6
+        )
+        self.assertLessEqual(self.count_post_queries(url + 'complete/'), 9)
+
+
+class TransitionValidationTests(TestCase):
+    """Valores fora do limite nas fases viram 400, nunca 500"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = BreathingSession.objects.create(user=self.user, rounds=2, status='holding')
+        self.url = f'/api/sessions/{self.session.pk}/end_hold/'
+
+    def end_hold(self, body):
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def test_rejects_non_finite_hold(self):
+        response = self.end_hold('{"round_number": 1, "hold_seconds": 1e400}')
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_rejects_round_beyond_session(self):
+        response = self.end_hold('{"round_number": 50000, "hold_seconds": 60}')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(self.session.round_times.exists())
+
+    def test_accepts_round_in_range(self):
+        response = self.end_hold('{"round_number": 2, "hold_seconds": 60}')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['hold_times'], [{'hold': 0, 'recovery': 0}, {'hold': 60, 'recovery': 0}])
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= e ?view=summary nas listagens de sessões"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        BreathingSession.objects.create(user=self.user, rounds=2)
+
+    def test_requested_fields_only(self):
+        response = self.client.get('/api/sessions/?fields=id,status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status'})
+
+    def test_summary_view(self):
+        results = self.client.get('/api/sessions/?view=summary').json()['results']
+        self.assertEqual(set(results[0]), {
+            'id', 'rounds', 'started_at', 'completed_at', 'actual_duration', 'duration_formatted', 'status'
+        })
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/sessions/?fields=id,bogus,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus, nope', str(response.json()['fields']))
+        self.assertEqual(self.client.get('/api/sessions/active/?fields=bogus').status_code, 400)
+
+
+class SessionCompletionTests(TestCase):
+    """Conclusões repetidas ou concorrentes contabilizam a sessão uma única vez"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = BreathingSession.objects.create(user=self.user, rounds=3)
+        self.session.add_hold_time(1, 90)
+
+    def test_repeated_complete_counts_once(self):
+        url = f'/api/sessions/{self.session.pk}/complete/'
+        first = self.client.post(url)
+        second = self.client.post(url)
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(second.json()['completed_at'], first.json()['completed_at'])
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_sessions, 1)
+        self.assertEqual(self.client.get('/api/sessions/stats/').json()['total_sessions'], 1)
+        history = self.client.get('/api/sessions/history/?days=1').json()
+        self.assertEqual([(day['session_count'], day['best_hold_seconds']) for day in history], [(1, 90)])
+
+    def test_concurrent_complete_counts_once(self):
+        # Duas requisições que leram a sessão antes de qualquer uma concluir
+        stale = BreathingSession.objects.get(pk=self.session.pk)
+        self.assertTrue(self.session.complete_session())
+        self.assertFalse(stale.complete_session())
+        self.assertEqual(stale.status, 'completed')
+        self.assertEqual(UserProfile.objects.get(user=self.user).total_sessions, 1)
+        self.assertEqual(DailySessionRollup.objects.get(user=self.user).session_count, 1)
+
+    def test_patch_cannot_change_status(self):
+        response = self.client.patch(
+            f'/api/sessions/{self.session.pk}/',
+            {'status': 'completed', 'completed_at': '2026-01-01T10:00:00Z', 'notes': 'ok'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.status, self.session.completed_at, self.session.notes), ('in_progress', None, 'ok'))
+        self.assertFalse(UserProfile.objects.filter(user=self.user, total_sessions__gt=0).exists())
+
+    def test_cancelled_session_is_not_completed(self):
+        self.client.post(f'/api/sessions/{self.session.pk}/cancel/')
+        response = self.client.post(f'/api/sessions/{self.session.pk}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserProfile.objects.filter(user=self.user, total_sessions__gt=0).exists())
+
+
+class ResponseCacheTests(TestCase):
+    """Respostas cacheadas por usuário são invalidadas após o commit das escritas"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.session = BreathingSession.objects.create(user=self.user, rounds=2)
+
+    def get(self, url):
+        return self.client.get(url).json()
+
+    def test_cached_read_runs_no_queries(self):
+        first = self.get('/api/sessions/stats/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/sessions/stats/'), first)
+
+    def test_completion_invalidates_stats_after_commit(self):
+        self.assertEqual(self.get('/api/sessions/stats/')['total_sessions'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/sessions/{self.session.pk}/complete/')
+        self.assertEqual(self.get('/api/sessions/stats/')['total_sessions'], 1)
+
+    def test_cache_is_kept_until_commit(self):
+        self.get('/api/sessions/stats/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/api/sessions/{self.session.pk}/complete/')
+            # Antes do commit a resposta antiga continua valendo
+            self.assertEqual(self.get('/api/sessions/stats/')['total_sessions'], 0)
+        self.assertTrue(callbacks)
+
+    def test_session_update_and_delete_invalidate_recent(self):
+        self.assertEqual([item['notes'] for item in self.get('/api/sessions/recent/')], [''])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/sessions/{self.session.pk}/', {'notes': 'calma'}, format='json')
+        self.assertEqual([item['notes'] for item in self.get('/api/sessions/recent/')], ['calma'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/sessions/{self.session.pk}/')
+        self.assertEqual(self.get('/api/sessions/recent/'), [])
+
+    def test_profile_update_invalidates_cached_responses(self):
+        self.get('/api/sessions/stats/')
+        self.get('/api/sessions/recent/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/profiles/update_me/', {'bio': 'oi'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(cache.get(f'breathing:stats:{self.user.id}'))
+        self.assertIsNone(cache.get(f'breathing:recent:{self.user.id}'))
+
+
+class RollupMaintenanceTests(TestCase):
+    """Resumos diários e ranking mantidos incrementalmente batem com o recálculo completo"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.first = BreathingSession.objects.create(user=self.user, rounds=2)
+        self.second = BreathingSession.objects.create(user=self.user, rounds=2)
+        self.first.add_hold_time(1, 120)
+        self.second.add_hold_time(1, 90)
+        self.first.complete_session()
+        self.second.complete_session()
+
+    def snapshot(self):
+        rollups = list(DailySessionRollup.objects.filter(user=self.user).values_list(
+            'day', 'session_count', 'breathing_time', 'hold_count', 'total_hold_seconds', 'best_hold_seconds'
+        ).order_by('day'))
+        scores = list(LeaderboardScore.objects.filter(user=self.user).values_list(
+            'period', 'session_count', 'breathing_time', 'best_hold_seconds'
+        ).order_by('period'))
+        return rollups, scores
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        call_command('rebuild_session_rollups', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def best_holds(self):
+        return (
+            DailySessionRollup.objects.get(user=self.user).best_hold_seconds,
+            sorted(LeaderboardScore.objects.filter(user=self.user).values_list('best_hold_seconds', flat=True)),
+        )
+
+    def test_hold_corrected_downward_lowers_best(self):
+        self.assertEqual(self.best_holds(), (120, [120, 120]))
+        self.first.add_hold_time(1, 30)
+        self.assertEqual(self.best_holds(), (90, [90, 90]))
+        self.assertEqual(DailySessionRollup.objects.get(user=self.user).total_hold_seconds, 120)
+        self.assertMatchesRebuild()
+
+    def test_deleted_session_is_removed_from_totals(self):
+        response = self.client.delete(f'/api/sessions/{self.first.pk}/')
+        self.assertEqual(response.status_code, 204)
+        rollup = DailySessionRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.session_count, rollup.hold_count, rollup.best_hold_seconds), (1, 1, 90))
+        self.assertEqual(self.best_holds(), (90, [90, 90]))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.assertMatchesRebuild()
+
+    def test_patch_hold_times_rewrites_rounds(self):
+        url = f'/api/sessions/{self.first.pk}/'
+        response = self.client.patch(url, {'hold_times': [{'hold': 40, 'recovery': 10}, {'hold': 150}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['hold_times'], [{'hold': 40, 'recovery': 10}, {'hold': 150, 'recovery': 0}])
+        self.assertEqual(self.best_holds(), (150, [150, 150]))
+        self.assertMatchesRebuild()
+
+        response = self.client.patch(url, {'hold_times': []}, format='json')
+        self.assertEqual(response.json()['hold_times'], [])
+        self.assertEqual(self.best_holds(), (90, [90, 90]))
+        self.assertMatchesRebuild()
+
+    def test_patch_invalid_hold_times_is_rejected(self):
+        url = f'/api/sessions/{self.first.pk}/'
+        for hold_times in ([{'hold': -1}], [{'hold': 'x'}], [{'hold': 1}] * 3, 'abc'):
+            with self.subTest(hold_times=hold_times):
+                response = self.client.patch(url, {'hold_times': hold_times}, format='json')
+                self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(BreathingSession.objects.get(pk=self.first.pk).hold_times, [{'hold': 120, 'recovery': 0}])
+
+
+class SessionEventBatchTests(TestCase):
+    """Lote de eventos de fase: aplicado por inteiro ou rejeitado sem gravar nada"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = BreathingSession.objects.create(user=self.user, rounds=2)
+        self.url = f'/api/sessions/{self.session.pk}/events/'
+        self.start = self.session.started_at
+
+    def at(self, seconds):
+        return (self.start + timezone.timedelta(seconds=seconds)).isoformat()
+
+    def test_applies_round_with_computed_durations(self):
+        response = self.client.post(self.url, {'events': [
+            {'action': 'next_round', 'at': self.at(1)},
+            {'action': 'start_hold', 'at': self.at(100)},
+            {'action': 'end_hold', 'at': self.at(175), 'round_number': 1},
+            {'action': 'end_recovery', 'at': self.at(190), 'round_number': 1},
+            {'action': 'complete', 'at': self.at(200)},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['hold_times'], [{'hold': 75, 'recovery': 15}])
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+        self.assertEqual(self.session.actual_duration, timezone.timedelta(seconds=200))
+        self.assertEqual(UserProfile.objects.get(user=self.user).total_sessions, 1)
+
+    def assertRejectedWithoutWrites(self, events):
+        response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'in_progress')
+        self.assertFalse(self.session.round_times.exists())
+        return response.json()['error']
+
+    def test_rejects_out_of_order_events(self):
+        error = self.assertRejectedWithoutWrites([
+            {'action': 'start_hold', 'at': self.at(100)},
+            {'action': 'end_hold', 'at': self.at(50), 'round_number': 1, 'hold_seconds': 60},
+        ])
+        self.assertTrue(error.startswith('Evento 2 (end_hold)'), error)
+
+    def test_rejects_invalid_transition_in_batch(self):
+        error = self.assertRejectedWithoutWrites([
+            {'action': 'start_hold', 'at': self.at(10)},
+            {'action': 'end_hold', 'at': self.at(70), 'round_number': 1, 'hold_seconds': 60},
+            {'action': 'end_hold', 'at': self.at(80), 'round_number': 1, 'hold_seconds': 70},
+        ])
+        self.assertTrue(error.startswith('Evento 3 (end_hold)'), error)
+
+
+class FriendshipTests(TestCase):
+    """Fluxo de solicitações de amizade"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.client = APIClient()
+        cache.clear()
+
+    def send_request(self, sender, addressee):
+        self.client.force_authenticate(sender)
+        return self.client.post(
+            '/api/friendships/send_request/', {'addressee_username': addressee.username}, format='json'
+        )
+
+    def test_accept_with_stale_cached_graph(self):
+        # Grafo de bob em cache antes da solicitação (a invalidação só roda
+        # após o commit e, em outro processo, nem chegaria a este cache)
+        self.assertEqual(Friendship.friend_ids(self.bob.id), [])
+        friendship_id = self.send_request(self.alice, self.bob).json()['id']
+
+        self.client.force_authenticate(self.bob)
+        pending = self.client.get('/api/friendships/pending_requests/').json()
+        self.assertEqual([item['id'] for item in pending], [friendship_id])
+        response = self.client.post(f'/api/friendships/{friendship_id}/accept/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['status'], 'accepted')
+
+    def test_pair_key_is_unordered(self):
+        friendship = Friendship.objects.create(requester=self.bob, addressee=self.alice)
+        self.assertEqual(friendship.pair_key, f'{self.alice.id}:{self.bob.id}')
+        self.assertEqual(Friendship.between(self.alice.id, self.bob.id), friendship)
+        self.assertEqual(Friendship.between(self.bob.id, self.alice.id), friendship)
+
+    def test_crossed_requests_become_friendship(self):
+        first = self.send_request(self.alice, self.bob)
+        crossed = self.send_request(self.bob, self.alice)
+        self.assertEqual(crossed.status_code, 201, crossed.content)
+        self.assertEqual(crossed.json()['id'], first.json()['id'])
+        self.assertEqual(crossed.json()['status'], 'accepted')
+        self.assertEqual(Friendship.objects.count(), 1)
+
+    def test_requester_cannot_self_accept(self):
+        self.client.force_authenticate(self.alice)
+        forged = self.client.post(
+            '/api/friendships/send_request/',
+            {'addressee_username': self.bob.username, 'status': 'accepted'}, format='json'
+        )
+        self.assertEqual(forged.status_code, 201, forged.content)
+        self.assertEqual(forged.json()['status'], 'pending')
+        friendship_id = forged.json()['id']
+
+        patched = self.client.patch(f'/api/friendships/{friendship_id}/', {'status': 'accepted'}, format='json')
+        self.assertEqual(patched.json()['status'], 'pending')
+        accepted = self.client.post(f'/api/friendships/{friendship_id}/accept/')
+        self.assertEqual(accepted.status_code, 403)
+        self.assertEqual(Friendship.objects.get().status, 'pending')
+        self.assertFalse(Friendship.are_friends(self.alice.id, self.bob.id))
+
+    def test_duplicate_request_is_rejected(self):
+        self.send_request(self.alice, self.bob)
+        duplicate = self.send_request(self.alice, self.bob)
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(Friendship.objects.count(), 1)
+
+
+class FeedTests(TestCase):
+    """Feed de atividades: fan-out na conclusão, backfill ao aceitar e limpeza ao desfazer a amizade"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.carol = User.objects.create_user('carol')
+        self.client = APIClient()
+        cache.clear()
+
+    def complete_session(self, user, hold=60):
+        session = BreathingSession.objects.create(user=user, rounds=1)
+        session.add_hold_time(1, hold)
+        session.complete_session()
+        return session
+
+    def feed(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [(entry['session'], entry['total_hold_seconds']) for entry in response.json()['results']]
+
+    def befriend(self, requester, addressee):
+        friendship = Friendship.objects.create(requester=requester, addressee=addressee)
+        self.client.force_authenticate(addressee)
+        response = self.client.post(f'/api/friendships/{friendship.pk}/accept/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return friendship
+
+    def test_accepting_backfills_recent_sessions_both_ways(self):
+        with mock.patch.object(FeedEntry, 'BACKFILL_SESSIONS', 2):
+            bob_sessions = [self.complete_session(self.bob, hold) for hold in (30, 40, 50)]
+            alice_session = self.complete_session(self.alice)
+            self.befriend(self.alice, self.bob)
+        self.assertEqual(self.feed(self.alice), [(bob_sessions[2].pk, 50), (bob_sessions[1].pk, 40)])
+        self.assertEqual(self.feed(self.bob), [(alice_session.pk, 60)])
+
+    def test_completion_fans_out_to_friends_only(self):
+        self.befriend(self.alice, self.bob)
+        session = self.complete_session(self.alice, hold=75)
+        self.assertEqual(self.feed(self.bob), [(session.pk, 75)])
+        self.assertEqual(self.feed(self.carol), [])
+        self.assertEqual(self.feed(self.alice), [])
+
+    def test_pending_request_shares_nothing(self):
+        Friendship.objects.create(requester=self.alice, addressee=self.bob)
+        self.complete_session(self.alice)
+        self.assertEqual(self.feed(self.bob), [])
+
+    def test_unfriending_removes_entries(self):
+        friendship = self.befriend(self.alice, self.bob)
+        self.complete_session(self.alice)
+        self.complete_session(self.bob)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.delete(f'/api/friendships/{friendship.pk}/').status_code, 204)
+        self.assertEqual(self.feed(self.alice), [])
+        self.assertEqual(self.feed(self.bob), [])
+
+
+class LeaderboardTests(TestCase):
+    """Ranking entre amigos lido das pontuações mantidas incrementalmente"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.carol = User.objects.create_user('carol')
+        self.dave = User.objects.create_user('dave')
+        Friendship.objects.create(requester=self.alice, addressee=self.bob, status='accepted')
+        Friendship.objects.create(requester=self.dave, addressee=self.alice, status='accepted')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        cache.clear()
+
+    def complete_session(self, user, hold):
+        session = BreathingSession.objects.create(user=user, rounds=1)
+        session.add_hold_time(1, hold)
+        session.complete_session()
+        return session
+
+    def ranking(self, **params):
+        response = self.client.get('/api/leaderboard/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(item['rank'], item['user']['username'], item['value']) for item in response.json()['results']]
+
+    def test_friends_ranked_by_metric(self):
+        self.complete_session(self.alice, 90)
+        bob_session = self.complete_session(self.bob, 120)
+        self.complete_session(self.bob, 30)
+        self.complete_session(self.carol, 300)
+
+        self.assertEqual(
+            self.ranking(metric='best_hold', period='all'),
+            [(1, 'bob', 120), (2, 'alice', 90), (3, 'dave', 0)],
+        )
+        self.assertEqual(
+            self.ranking(metric='sessions', period='week'),
+            [(1, 'bob', 2), (2, 'alice', 1), (3, 'dave', 0)],
+        )
+
+        # Apagar a sessão com a maior retenção atualiza o ranking
+        self.client.force_authenticate(self.bob)
+        self.client.delete(f'/api/sessions/{bob_session.pk}/')
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(
+            self.ranking(metric='best_hold', period='all'),
+            [(1, 'alice', 90), (2, 'bob', 30), (3, 'dave', 0)],
+        )
+
+    def test_ties_share_rank(self):
+        self.complete_session(self.alice, 60)
+        self.complete_session(self.bob, 60)
+        self.assertEqual(
+            self.ranking(metric='best_hold', period='week'),
+            [(1, 'alice', 60), (1, 'bob', 60), (3, 'dave', 0)],
+        )
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/leaderboard/?period=month').status_code, 400)
+        self.assertEqual(self.client.get('/api/leaderboard/?metric=bogus').status_code, 400)
+
+
+class UserSearchTests(TestCase):
+    """Índice de busca mantido pelo post_save de User e ordem dos resultados"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.joao = User.objects.create_user('João_Silva')
+        self.joana = User.objects.create_user('joana')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/users/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(item['username'], item['relationship']) for item in response.json()['results']]
+
+    def test_new_user_is_indexed(self):
+        self.assertEqual(UserSearchTerm.objects.get(user=self.joao).term, 'joao_silva')
+        self.assertTrue(UserSearchTrigram.objects.filter(user=self.joao, trigram=' jo').exists())
+
+    def test_prefix_search_ignores_accents_and_case(self):
+        self.assertEqual(self.search('JOÃO_S'), [('João_Silva', None)])
+        self.assertEqual(self.search('jo'), [('joana', None), ('João_Silva', None)])
+        # Prefixo antes da correspondência aproximada ('joana' tem metade dos trigramas)
+        self.assertEqual(self.search('joao'), [('João_Silva', None), ('joana', None)])
+
+    def test_fuzzy_search_finds_typos(self):
+        self.assertEqual(self.search('silvq'), [])
+        self.assertEqual(self.search('joao_silvq'), [('João_Silva', None)])
+
+    def test_renamed_user_is_reindexed(self):
+        self.joana.username = 'mariana'
+        self.joana.save()
+        self.assertEqual(self.search('joana'), [])
+        self.assertEqual(self.search('mari'), [('mariana', None)])
+        self.assertFalse(UserSearchTrigram.objects.filter(user=self.joana, trigram=' jo').exists())
+
+    def test_friends_come_first(self):
+        Friendship.objects.create(requester=self.alice, addressee=self.joao, status='accepted')
+        self.assertEqual(self.search('jo'), [('João_Silva', 'friend'), ('joana', None)])
+        self.assertEqual(self.search('alice'), [])
+
+
+class IdempotencyTests(TestCase):
+    """Repetições com a mesma Idempotency-Key"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        idempotency_cache().clear()
+
+    def create_session(self, key, rounds=3):
+        return self.client.post(
+            '/api/sessions/', {'rounds': rounds}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_replay_returns_stored_response_without_queries(self):
+        first = self.create_session('abc')
+        self.assertEqual(first.status_code, 201, first.content)
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.create_session('abc')
+        self.assertEqual(len(queries), 0, [query['sql'] for query in queries])
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(BreathingSession.objects.count(), 1)
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        self.create_session('abc')
+        response = self.create_session('abc', rounds=4)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(BreathingSession.objects.count(), 1)
+
+    def test_error_responses_are_not_stored(self):
+        invalid = self.client.post('/api/sessions/', {'rounds': 'x'}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(invalid.status_code, 400)
+        # A mesma chave vale para a tentativa corrigida
+        self.assertEqual(self.create_session('abc').status_code, 201)
+
+        session = BreathingSession.objects.get()
+        url = f'/api/sessions/{session.pk}/end_hold/'
+        body = {'round_number': 1, 'hold_seconds': 60}
+        early = self.client.post(url, body, format='json', HTTP_IDEMPOTENCY_KEY='hold-1')
+        self.assertEqual(early.status_code, 400)
+        self.client.post(f'/api/sessions/{session.pk}/start_hold/')
+        retry = self.client.post(url, body, format='json', HTTP_IDEMPOTENCY_KEY='hold-1')
+        self.assertEqual(retry.status_code, 200, retry.content)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+    def test_key_in_progress_returns_conflict(self):
+        factory = APIRequestFactory()
+        http_request = factory.post('/api/sessions/', {'rounds': 3}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        force_authenticate(http_request, self.user)
+        request = APIView().initialize_request(http_request)
+        nested = []
+
+        def compute():
+            # Segunda tentativa chega enquanto a primeira ainda executa
+            nested.append(idempotent_response(request, 'test', lambda: Response(status=201)))
+            return Response({'ok': True}, status=201)
+
+        self.assertEqual(idempotent_response(request, 'test', compute).status_code, 201)
+        self.assertEqual(nested[0].status_code, 409)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SessionSocketTests(TestCase):
+    """Canal em tempo real: autenticação por subprotocolo, origem e repasse aos amigos"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('alice')
+        self.friend = User.objects.create_user('bob')
+        self.stranger = User.objects.create_user('carol')
+        Friendship.objects.create(requester=self.owner, addressee=self.friend, status='accepted')
+        self.session = BreathingSession.objects.create(
+            user=self.owner, rounds=2, started_at=timezone.now() - timedelta(minutes=10)
+        )
+        self.tokens = {
+            user.pk: str(BreathingRefreshToken.for_user(user).access_token)
+            for user in (self.owner, self.friend, self.stranger)
+        }
+        # Mesma pilha de core/asgi.py, montada com o ALLOWED_HOSTS do teste
+        self.application = AllowedHostsOriginValidator(URLRouter(websocket_urlpatterns))
+
+    def communicator(self, user=None, origin=b'http://testserver'):
+        subprotocols = None
+        if user is not None:
+            subprotocols = [TOKEN_SUBPROTOCOL, self.tokens[user.pk]]
+        return WebsocketCommunicator(
+            self.application, f'/ws/sessions/{self.session.pk}/',
+            headers=[(b'origin', origin), (b'host', b'testserver')], subprotocols=subprotocols,
+        )
+
+    async def connect(self, user=None, origin=b'http://testserver'):
+        communicator = self.communicator(user, origin)
+        connected, detail = await communicator.connect()
+        return communicator, connected, detail
+
+    async def test_rejected_connections(self):
+        for user, origin, expected in (
+            (None, b'http://testserver', 4401),
+            (self.stranger, b'http://testserver', 4403),
+            (self.owner, b'http://evil.example', None),
+        ):
+            with self.subTest(user=user, origin=origin):
+                communicator, connected, code = await self.connect(user, origin)
+                self.assertFalse(connected)
+                if expected:
+                    self.assertEqual(code, expected)
+                await communicator.disconnect()
+
+    async def test_friend_receives_hold_timings(self):
+        owner, connected, subprotocol = await self.connect(self.owner)
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, TOKEN_SUBPROTOCOL)
+        friend, connected, _ = await self.connect(self.friend)
+        self.assertTrue(connected)
+        for communicator in (owner, friend):
+            self.assertEqual((await communicator.receive_json_from())['type'], 'session.state')
+
+        started = timezone.now() - timedelta(minutes=5)
+        events = [
+            {'action': 'start_hold', 'at': started.isoformat()},
+            {'action': 'end_hold', 'at': (started + timedelta(seconds=75)).isoformat(), 'round_number': 1},
+            {'action': 'end_recovery', 'at': (started + timedelta(seconds=90)).isoformat(),
+             'round_number': 1, 'recovery_seconds': 15},
+        ]
+        received = []
+        for event in events:
+            await owner.send_json_to(event)
+            self.assertEqual((await owner.receive_json_from())['type'], 'ack')
+            received.append(await friend.receive_json_from())
+        self.assertEqual(received[1]['hold_seconds'], 75)
+        self.assertEqual(received[2]['recovery_seconds'], 15)
+
+        # Amigos apenas acompanham
+        await friend.send_json_to(events[0])
+        self.assertEqual((await friend.receive_json_from())['type'], 'error')
+
+        await owner.disconnect()
+        await friend.disconnect()
+        hold_times = await database_sync_to_async(
+            lambda: BreathingSession.objects.get(pk=self.session.pk).hold_times
+        )()
+        self.assertEqual(hold_times, [{'hold': 75, 'recovery': 15}])
+
+
+class SessionTransferTests(TestCase):
+    """Exportação e importação do histórico"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content, name='sessoes.jsonl'):
+        return self.client.post(
+            '/api/sessions/import/', {'file': SimpleUploadedFile(name, content.encode())}, format='multipart'
+        )
+
+    def export(self, file_format='jsonl'):
+        response = self.client.get(f'/api/sessions/export/?file_format={file_format}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_streaming_mode_follows_entry_point(self):
+        self.assertFalse(self.client.get('/api/sessions/export/').is_async)
+        with mock.patch('breathing.transfer._served_by_asgi', True):
+            self.assertTrue(self.client.get('/api/sessions/export/').is_async)
+            with override_settings(BREATHING_ASYNC_STREAMING=False):
+                self.assertFalse(self.client.get('/api/sessions/export/').is_async)
+
+    def test_invalid_numbers_are_rejected(self):
+        base = {'started_at': '2025-01-01T10:00:00', 'rounds': 3, 'actual_duration': 400}
+        invalid = [
+            ('actual_duration', '1e400'),
+            ('actual_duration', '1e12'),
+            ('actual_duration', 'NaN'),
+            ('rounds', '99999999999999999999'),
+            ('breath_duration', 'Infinity'),
+            ('started_at', '"9999-12-31T23:59:59"'),
+        ]
+        for field, literal in invalid:
+            with self.subTest(field=field, value=literal):
+                line = json.dumps({**base, field: 0})
+                line = line.replace(f'"{field}": 0', f'"{field}": {literal}')
+                response = self.upload(line + '\n')
+                self.assertEqual(response.status_code, 400, response.content)
+                self.assertIn('Linha 1', response.json()['error'])
+        self.assertFalse(BreathingSession.objects.exists())
+
+    def test_export_round_trips_through_import(self):
+        jsonl = '\n'.join(json.dumps(row) for row in [
+            {'started_at': '2025-01-01T10:00:00-03:00', 'rounds': 3, 'actual_duration': 400,
+             'hold_times': [{'hold': 60, 'recovery': 15}, {'hold': 75, 'recovery': 15}, {'hold': 90, 'recovery': 15}],
+             'stats': {'stress_level_before': 7, 'mood_after': 'calmo'}},
+            {'started_at': '2025-01-02T10:00:00-03:00', 'rounds': 2, 'status': 'cancelled', 'notes': 'interrompida'},
+        ]) + '\n'
+        self.assertEqual(self.upload(jsonl).json(), {'imported': 2, 'skipped': 0})
+        # Reimportar o mesmo arquivo não duplica sessões
+        self.assertEqual(self.upload(jsonl).json(), {'imported': 0, 'skipped': 2})
+        exported = {file_format: self.export(file_format) for file_format in ('jsonl', 'csv')}
+
+        session = BreathingSession.objects.get(status='completed')
+        self.assertEqual(session.started_at.isoformat(), '2025-01-01T13:00:00+00:00')
+        self.assertEqual([item['hold'] for item in session.hold_times], [60, 75, 90])
+
+        for file_format, content in exported.items():
+            with self.subTest(file_format=file_format):
+                BreathingSession.objects.all().delete()
+                response = self.upload(content, f'sessoes.{file_format}')
+                self.assertEqual(response.json(), {'imported': 2, 'skipped': 0})
+                self.assertEqual(self.export(file_format), content)
+        self.assertEqual(SessionRound.objects.count(), 3)
+        self.assertEqual(SessionStats.objects.get().stress_level_before, 7)
+
+
+class StatelessAuthenticationTests(TestCase):
+    """Access token autentica pelas claims, sem ler auth_user"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret-pass')
+        BreathingSession.objects.create(user=self.user, rounds=2)
+        self.client = APIClient()
+
+    def get(self, access, url='/api/sessions/?view=summary'):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def access_token(self, **claims):
+        access = BreathingRefreshToken.for_user(self.user).access_token
+        for claim, value in claims.items():
+            access[claim] = value
+        return access
+
+    def test_request_does_not_load_user_row(self):
+        access = self.access_token()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(access)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertFalse([query['sql'] for query in queries if 'auth_user' in query['sql']])
+
+    def test_login_token_carries_claims(self):
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'alice', 'password': 'secret-pass'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get(response.json()['access']).status_code, 200)
+
+    def test_inactive_claim_is_rejected(self):
+        self.assertEqual(self.get(self.access_token(is_active=False)).status_code, 401)
+
+    def test_malformed_user_id_is_rejected(self):
+        self.assertEqual(self.get(self.access_token(user_id='abc')).status_code, 401)
+
+    def test_deactivated_user_cannot_refresh(self):
+        refresh = BreathingRefreshToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post('/api/auth/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class RefreshTokenRotationTests(TestCase):
+    """Cada refresh token vale para uma única rotação"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_consumed_token_is_rejected(self):
+        token = BreathingRefreshToken.for_user(self.user)
+        first = self.refresh(token)
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        # O token novo continua válido (uma vez)
+        self.assertEqual(self.refresh(first.json()['refresh']).status_code, 200)
+
+    def test_token_without_record_rotates_once(self):
+        token = BreathingRefreshToken.for_user(self.user)
+        RefreshTokenRecord.objects.all().delete()
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_prune_deletes_only_expired_records(self):
+        BreathingRefreshToken.for_user(self.user)
+        BreathingRefreshToken.for_user(self.user)
+        kept = BreathingRefreshToken.for_user(self.user)
+        RefreshTokenRecord.objects.exclude(pk=kept['jti']).update(
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(RefreshTokenRecord.prune(batch_size=1), 2)
+        self.assertEqual(list(RefreshTokenRecord.objects.values_list('pk', flat=True)), [UUID(kept['jti'])])
+
+
+class LoginLimiterTests(TestCase):
+    """Sem vaga para verificar a senha, o login falha logo com 503"""
+
+    def setUp(self):
+        User.objects.create_user('alice', password='secret-pass')
+        self.client = APIClient()
+        cache.clear()
+
+    def login_while_busy(self, limiter):
+        with mock.patch('breathing.serializers.password_check_limiter', limiter), limiter.slot('test'):
+            started = time.perf_counter()
+            response = self.client.post(
+                '/api/auth/login/', {'username': 'alice', 'password': 'secret-pass'}, format='json'
+            )
+            return response, time.perf_counter() - started
+
+    def test_full_queue_is_rejected_immediately(self):
+        response, elapsed = self.login_while_busy(PasswordCheckLimiter(slots=1, queue=0, timeout=5))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertLess(elapsed, 1)
+
+    def test_queued_login_gives_up_after_timeout(self):
+        response, elapsed = self.login_while_busy(PasswordCheckLimiter(slots=1, queue=1, timeout=0.1))
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(elapsed, 1)
+
+
+class MetricsAccessTests(TestCase):
+    """/api/metrics/ só para staff ou para o coletor com o token configurado"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_anonymous_and_regular_users_are_rejected(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user('alice'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_staff_user_is_allowed(self):
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    @override_settings(BREATHING_METRICS_TOKEN='scrape-secret')
+    def test_configured_token_is_allowed(self):
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_X_METRICS_TOKEN='scrape-secret').status_code, 200)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_X_METRICS_TOKEN='wrong').status_code, 401)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Planos de execução verificados no SQLite")
+class IndexUsageTests(TestCase):
+    """Garante via EXPLAIN que as queries quentes usam os índices compostos"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_session_history_uses_started_index(self):
+        self.assertUsesIndex(
+            BreathingSession.objects.filter(user=self.user).order_by('-started_at'),
+            'session_user_started_idx'
+        )
+
+    def test_active_session_uses_partial_index(self):
+        self.assertUsesIndex(
+            BreathingSession.objects.filter(user=self.user, status='in_progress').order_by('-started_at'),
+            'session_user_active_idx'
+        )
+
+    def test_completed_period_uses_status_index(self):
+        self.assertUsesIndex(
+            BreathingSession.objects.filter(
+                user=self.user, status='completed', completed_at__gte=timezone.now()
+            ).order_by(),
+            'session_user_status_idx'
+        )
+
+    def test_friendship_lookups_use_status_indexes(self):
+        self.assertUsesIndex(
+            Friendship.objects.filter(addressee=self.user, status='pending'),
+            'friendship_addressee_idx'
+        )
+        self.assertUsesIndex(
+            Friendship.objects.filter(requester=self.user, status='pending'),
+            'friendship_requester_idx'
+        )
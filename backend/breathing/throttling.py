@@ -0,0 +1,24 @@
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """Tentativas de login por IP (DEFAULT_THROTTLE_RATES['login_ip'])"""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameThrottle(SimpleRateThrottle):
+    """Tentativas de login por username, de qualquer IP (DEFAULT_THROTTLE_RATES['login_username'])"""
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username.strip():
+            return None
+        # O username vem do cliente: o hash mantém a chave do cache curta e segura
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
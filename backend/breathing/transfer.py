@@ -0,0 +1,368 @@
+import csv
+import io
+import json
+import math
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_user_responses
+from .dbutils import bulk_create_with_pks
+from .models import BreathingSession, DailySessionRollup, SessionRound, SessionStats, UserProfile
+from .transitions import MAX_PHASE_SECONDS
+
+# Formatos aceitos na exportação e na importação
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+SESSION_FIELDS = [
+    'started_at', 'completed_at', 'status', 'rounds', 'breaths_per_round', 'breath_duration',
+    'planned_duration', 'actual_duration', 'notes', 'hold_times',
+]
+STATS_NUMBER_FIELDS = [
+    'avg_heart_rate', 'max_heart_rate', 'min_heart_rate', 'stress_level_before', 'stress_level_after',
+]
+STATS_TEXT_FIELDS = ['mood_before', 'mood_after']
+STATS_FIELDS = STATS_NUMBER_FIELDS + STATS_TEXT_FIELDS
+# Colunas do CSV: hold_times vai como JSON e as estatísticas achatadas
+CSV_COLUMNS = SESSION_FIELDS + [f'stats_{name}' for name in STATS_FIELDS]
+
+IMPORTABLE_STATUSES = ('completed', 'cancelled')
+
+# Limites dos valores importados (campos inteiros do banco e durações da sessão)
+MAX_INTEGER = 2 ** 31 - 1
+MAX_ROUNDS = 1000
+MAX_BREATHS_PER_ROUND = 1000
+MAX_BREATH_SECONDS = 60
+MAX_SESSION_SECONDS = 7 * 24 * 60 * 60
+
+# Linhas agrupadas por bloco da resposta (menos trocas de thread no ASGI)
+STREAM_ROWS_PER_CHUNK = 500
+
+# Ligado por core/asgi.py: servido via ASGI, o streaming usa um iterador assíncrono
+_served_by_asgi = False
+
+
+class ImportRowError(ValueError):
+    """Linha inválida no arquivo importado"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Linha {line}: {message}')
+        self.message = f'Linha {line}: {message}'
+
+
+def _seconds(duration):
+    return duration.total_seconds() if duration is not None else None
+
+
+def session_row(session, include_user=False):
+    """Sessão (com rounds e estatísticas) como dicionário serializável em JSON"""
+    row = {'user': session.user.username} if include_user else {}
+    row.update({
+        'started_at': session.started_at.isoformat(),
+        'completed_at': session.completed_at.isoformat() if session.completed_at else None,
+        'status': session.status,
+        'rounds': session.rounds,
+        'breaths_per_round': session.breaths_per_round,
+        'breath_duration': session.breath_duration,
+        'planned_duration': _seconds(session.planned_duration),
+        'actual_duration': _seconds(session.actual_duration),
+        'notes': session.notes,
+        'hold_times': session.hold_times,
+    })
+    try:
+        stats = session.stats
+    except SessionStats.DoesNotExist:
+        stats = None
+    row['stats'] = {name: getattr(stats, name) for name in STATS_FIELDS} if stats else None
+    return row
+
+
+def export_rows(queryset, include_user=False, chunk_size=2000):
+    """Itera as sessões em blocos, sem carregar o histórico inteiro na memória"""
+    queryset = queryset.select_related('stats').prefetch_related('round_times')
+    if include_user:
+        queryset = queryset.select_related('user')
+    for session in queryset.order_by('started_at', 'id').iterator(chunk_size=chunk_size):
+        yield session_row(session, include_user)
+
+
+def _csv_line(writer, buffer, values):
+    writer.writerow(values)
+    line = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return line
+
+
+def render_rows(rows, file_format, include_user=False):
+    """Linhas do arquivo (jsonl ou csv) geradas uma a uma"""
+    if file_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    session_columns = (['user'] if include_user else []) + SESSION_FIELDS
+    yield _csv_line(writer, buffer, (['user'] if include_user else []) + CSV_COLUMNS)
+    for row in rows:
+        stats = row['stats'] or {}
+        values = [row[name] for name in session_columns]
+        values[session_columns.index('hold_times')] = json.dumps(row['hold_times'])
+        values += [stats.get(name) for name in STATS_FIELDS]
+        yield _csv_line(writer, buffer, ['' if value is None else value for value in values])
+
+
+def chunked(lines, size=STREAM_ROWS_PER_CHUNK):
+    """Agrupa as linhas em blocos para a resposta em streaming"""
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= size:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+async def aiterate(chunks):
+    """Versão assíncrona do iterador: sob ASGI um iterador síncrono seria lido por inteiro.
+
+    Cada bloco é gerado em sync_to_async (thread_sensitive), sempre na mesma
+    thread e conexão do banco da requisição.
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def serve_streams_async():
+    """Chamado pelo ponto de entrada ASGI: as exportações passam a usar aiterate"""
+    global _served_by_asgi
+    _served_by_asgi = True
+
+
+def streaming_chunks(chunks):
+    """Blocos no formato que o servidor lê sem acumular a resposta.
+
+    BREATHING_ASYNC_STREAMING força o modo; None (padrão) segue o ponto de
+    entrada: assíncrono sob core/asgi.py, o próprio iterador sob core/wsgi.py.
+    """
+    use_async = getattr(settings, 'BREATHING_ASYNC_STREAMING', None)
+    if use_async is None:
+        use_async = _served_by_asgi
+    return aiterate(chunks) if use_async else chunks
+
+
+def parse_file(lines, file_format):
+    """(número da linha, dicionário) de cada registro do arquivo"""
+    if file_format == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ImportRowError(number, 'JSON inválido')
+            if not isinstance(row, dict):
+                raise ImportRowError(number, 'cada linha deve ser um objeto JSON')
+            yield number, row
+        return
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        number = reader.line_num
+        try:
+            row['hold_times'] = json.loads(row.get('hold_times') or '[]')
+        except ValueError:
+            raise ImportRowError(number, 'hold_times deve ser uma lista JSON')
+        stats = {
+            name: row.pop(f'stats_{name}') for name in STATS_FIELDS
+            if row.get(f'stats_{name}') not in (None, '')
+        }
+        row['stats'] = stats or None
+        yield number, {key: value for key, value in row.items() if value != ''}
+
+
+def _number(row, field, number, cast=int, default=None, minimum=0, maximum=MAX_INTEGER):
+    value = row.get(field, default)
+    if value is None:
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError: int(float('inf')) de um JSON com 1e400
+        raise ImportRowError(number, f'{field} deve ser um número')
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ImportRowError(number, f'{field} deve ser um número')
+    if value < minimum:
+        raise ImportRowError(number, f'{field} deve ser maior ou igual a {minimum}')
+    if value > maximum:
+        raise ImportRowError(number, f'{field} deve ser menor ou igual a {maximum}')
+    return value
+
+
+def _datetime(row, field, number):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ImportRowError(number, f'{field} deve ser uma data ISO 8601')
+    if not 1 < parsed.year < 9999:
+        # Longe dos limites de datetime ao somar durações e converter para UTC
+        raise ImportRowError(number, f'{field} fora do intervalo aceito')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _rounds(row, number):
+    """hold_times como [{'hold': 70, 'recovery': 15}, ...] ou apenas [70, 85, ...]"""
+    hold_times = row.get('hold_times') or []
+    if not isinstance(hold_times, list):
+        raise ImportRowError(number, 'hold_times deve ser uma lista')
+    rounds = []
+    for round_number, item in enumerate(hold_times, 1):
+        item = item if isinstance(item, dict) else {'hold': item}
+        hold = _number(item, 'hold', number, default=0, maximum=MAX_PHASE_SECONDS)
+        recovery = _number(item, 'recovery', number, default=0, maximum=MAX_PHASE_SECONDS)
+        if hold or recovery:
+            rounds.append((round_number, hold, recovery))
+    return rounds
+
+
+def _stats(row, number):
+    stats = row.get('stats')
+    if not stats:
+        return None
+    if not isinstance(stats, dict):
+        raise ImportRowError(number, 'stats deve ser um objeto')
+    values = {name: _number(stats, name, number) for name in STATS_NUMBER_FIELDS}
+    values.update({name: str(stats.get(name) or '')[:20] for name in STATS_TEXT_FIELDS})
+    return values
+
+
+def build_session(user_id, row, number):
+    """(sessão, rounds, estatísticas) de uma linha validada"""
+    status = row.get('status') or 'completed'
+    if status not in IMPORTABLE_STATUSES:
+        raise ImportRowError(number, 'status deve ser completed ou cancelled')
+    started_at = _datetime(row, 'started_at', number)
+    if started_at is None:
+        raise ImportRowError(number, 'started_at é obrigatório')
+
+    rounds = _number(row, 'rounds', number, minimum=1, maximum=MAX_ROUNDS)
+    if rounds is None:
+        raise ImportRowError(number, 'rounds é obrigatório')
+    breaths_per_round = _number(
+        row, 'breaths_per_round', number, default=30, minimum=1, maximum=MAX_BREATHS_PER_ROUND
+    )
+    breath_duration = _number(
+        row, 'breath_duration', number, cast=float, default=3.55, maximum=MAX_BREATH_SECONDS
+    )
+    planned = _number(row, 'planned_duration', number, cast=float, maximum=MAX_SESSION_SECONDS)
+    actual = _number(row, 'actual_duration', number, cast=float, maximum=MAX_SESSION_SECONDS)
+    completed_at = _datetime(row, 'completed_at', number)
+    if completed_at is None and actual is not None:
+        completed_at = started_at + timedelta(seconds=actual)
+    if actual is None and completed_at is not None:
+        actual = (completed_at - started_at).total_seconds()
+    if actual is not None and actual < 0:
+        raise ImportRowError(number, 'completed_at deve ser posterior a started_at')
+    if actual is not None and actual > MAX_SESSION_SECONDS:
+        raise ImportRowError(number, f'a sessão deve durar no máximo {MAX_SESSION_SECONDS} segundos')
+    if status == 'completed' and completed_at is None:
+        raise ImportRowError(number, 'sessões concluídas precisam de completed_at ou actual_duration')
+
+    session = BreathingSession(
+        user_id=user_id,
+        started_at=started_at,
+        completed_at=completed_at,
+        status=status,
+        rounds=rounds,
+        breaths_per_round=breaths_per_round,
+        breath_duration=breath_duration,
+        planned_duration=timedelta(
+            seconds=planned if planned is not None else rounds * breaths_per_round * breath_duration
+        ),
+        actual_duration=timedelta(seconds=actual) if actual is not None else None,
+        notes=str(row.get('notes') or ''),
+    )
+    return session, _rounds(row, number), _stats(row, number)
+
+
+def _insert_batch(user_id, batch):
+    """Grava um lote de sessões novas; sessões já existentes (mesmo started_at) são puladas"""
+    existing = set(BreathingSession.objects.filter(
+        user_id=user_id, started_at__in=[session.started_at for session, _, _ in batch]
+    ).values_list('started_at', flat=True))
+    fresh, seen = [], set(existing)
+    for item in batch:
+        if item[0].started_at not in seen:
+            seen.add(item[0].started_at)
+            fresh.append(item)
+    if not fresh:
+        return 0
+
+    # (usuário, started_at) é único no lote: identifica as sessões sem RETURNING
+    sessions = bulk_create_with_pks(
+        BreathingSession, [session for session, _, _ in fresh], ['user_id', 'started_at']
+    )
+
+    SessionRound.objects.bulk_create([
+        SessionRound(session=session, round_number=round_number,
+                     hold_seconds=hold, recovery_seconds=recovery)
+        for session, (_, rounds, _) in zip(sessions, fresh)
+        for round_number, hold, recovery in rounds
+    ])
+    SessionStats.objects.bulk_create([
+        SessionStats(session=session, **stats)
+        for session, (_, _, stats) in zip(sessions, fresh) if stats
+    ])
+    return len(sessions)
+
+
+def import_sessions(user_id, lines, file_format, batch_size=None):
+    """Importa o histórico em lotes e recalcula perfil, resumos e ranking uma única vez.
+
+    Tudo ou nada: uma linha inválida desfaz a importação. Reimportar o mesmo
+    arquivo não duplica sessões (são puladas as com o mesmo started_at).
+    Retorna (importadas, puladas).
+    """
+    batch_size = batch_size or getattr(settings, 'BREATHING_IMPORT_BATCH_SIZE', 1000)
+    imported = total = 0
+    with transaction.atomic():
+        batch = []
+        for number, row in parse_file(lines, file_format):
+            batch.append(build_session(user_id, row, number))
+            total += 1
+            if len(batch) >= batch_size:
+                imported += _insert_batch(user_id, batch)
+                batch = []
+        if batch:
+            imported += _insert_batch(user_id, batch)
+
+        if imported:
+            totals = BreathingSession.objects.filter(
+                user_id=user_id, status='completed'
+            ).aggregate(count=Count('id'), time=Sum('actual_duration'))
+            UserProfile.objects.update_or_create(user_id=user_id, defaults={
+                'total_sessions': totals['count'],
+                'total_breathing_time': totals['time'] or timedelta(0),
+            })
+            DailySessionRollup.rebuild(user_ids=[user_id], batch_size=batch_size)
+            invalidate_user_responses(user_id)
+    return imported, total - imported
@@ -0,0 +1,223 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .cache import RECENT, invalidate_user_responses
+from .models import BreathingSession, SessionRound, DailySessionRollup
+
+
+class TransitionError(Exception):
+    """Transição inválida para o estado atual da sessão"""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class TransitionConflict(TransitionError):
+    """A sessão foi alterada por outra requisição durante a transição"""
+    status_code = status.HTTP_409_CONFLICT
+
+
+# ação -> (status de origem permitidos, status de destino, mensagem de erro)
+TRANSITIONS = {
+    'start_hold': (
+        ('in_progress', 'breathing'), 'holding',
+        'Sessão deve estar em progresso para iniciar retenção'
+    ),
+    'end_hold': (
+        ('holding',), 'recovery',
+        'Sessão deve estar em fase de retenção'
+    ),
+    'start_recovery': (
+        ('holding',), 'recovery',
+        'Sessão deve estar em retenção para iniciar recuperação'
+    ),
+    'end_recovery': (
+        ('recovery',), 'in_progress',
+        'Sessão deve estar em recuperação'
+    ),
+    'next_round': (
+        ('recovery', 'in_progress'), 'breathing',
+        'Status inválido para próximo round'
+    ),
+    'cancel': (
+        ('in_progress',), 'cancelled',
+        'Esta sessão já foi finalizada'
+    ),
+    'complete': (
+        ('in_progress', 'breathing', 'holding', 'recovery'), 'completed',
+        'Esta sessão já foi finalizada'
+    ),
+}
+
+# Tamanho máximo de um lote de eventos
+MAX_BATCH_EVENTS = 500
+
+# Duração máxima aceita para uma fase (segundos)
+MAX_PHASE_SECONDS = 24 * 60 * 60
+
+
+def _positive_int(data, field, minimum=0, maximum=MAX_PHASE_SECONDS):
+    value = data.get(field)
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError: int(float('inf')) de um JSON com 1e400
+        raise TransitionError(f'{field} deve ser um número inteiro')
+    if value < minimum:
+        raise TransitionError(f'{field} deve ser maior ou igual a {minimum}')
+    if value > maximum:
+        raise TransitionError(f'{field} deve ser menor ou igual a {maximum}')
+    return value
+
+
+class SessionStateMachine:
+    """Aplica transições de fase em memória e grava tudo em uma única escrita"""
+
+    def __init__(self, session):
+        self.session = session
+        self.original_status = session.status
+        self.changed_fields = set()
+        self.round_changes = {}
+        self.last_event_at = session.started_at
+        self.phase_started_at = {}
+
+    def apply(self, action, data=None):
+        """Valida e aplica uma ação sobre o estado em memória"""
+        if action not in TRANSITIONS:
+            raise TransitionError(f'Ação desconhecida: {action}')
+
+        data = data or {}
+        allowed, target, message = TRANSITIONS[action]
+        if self.session.status not in allowed:
+            raise TransitionError(message)
+
+        if action == 'end_hold':
+            self._require(data, 'round_number', 'hold_seconds')
+            round_number = _positive_int(data, 'round_number', minimum=1, maximum=self.session.rounds)
+            self.round_changes.setdefault(round_number, {}).update({
+                'hold_seconds': _positive_int(data, 'hold_seconds'),
+                'recovery_seconds': 0,
+            })
+        elif action == 'end_recovery':
+            self._require(data, 'round_number', 'recovery_seconds')
+            round_number = _positive_int(data, 'round_number', minimum=1, maximum=self.session.rounds)
+            self.round_changes.setdefault(round_number, {})['recovery_seconds'] = (
+                _positive_int(data, 'recovery_seconds')
+            )
+        elif action == 'complete':
+            self.session.completed_at = data.get('at') or timezone.now()
+            self.session.actual_duration = self.session.completed_at - self.session.started_at
+            self.changed_fields.update(['completed_at', 'actual_duration'])
+
+        self.session.status = target
+        self.changed_fields.add('status')
+        return self
+
+    def apply_event(self, event):
+        """Aplica um evento de fase com timestamp (`action`, `at` e dados da ação)"""
+        action = event['action']
+        at = event['at']
+        if at < self.last_event_at:
+            raise TransitionError('Evento fora de ordem')
+        if at > timezone.now() + timezone.timedelta(minutes=5):
+            raise TransitionError('Evento no futuro')
+
+        # Durações omitidas são calculadas a partir do evento que iniciou a fase
+        data = dict(event)
+        if action == 'end_hold' and data.get('hold_seconds') is None and 'hold' in self.phase_started_at:
+            data['hold_seconds'] = int((at - self.phase_started_at['hold']).total_seconds())
+        elif action == 'end_recovery' and data.get('recovery_seconds') is None and 'recovery' in self.phase_started_at:
+            data['recovery_seconds'] = int((at - self.phase_started_at['recovery']).total_seconds())
+
+        self.apply(action, data)
+
+        if action == 'start_hold':
+            self.phase_started_at['hold'] = at
+        elif action in ('end_hold', 'start_recovery'):
+            self.phase_started_at['recovery'] = at
+        self.last_event_at = at
+        return self
+
+    def _require(self, data, *fields):
+        if any(data.get(field) in (None, '') for field in fields):
+            raise TransitionError(f'{" e ".join(fields)} são obrigatórios')
+
+    def commit(self):
+        """Grava as alterações acumuladas em uma transação"""
+        session = self.session
+        # Rounds atuais (do prefetch da view, ou uma única leitura): dão a
+        # retenção anterior de cada round e voltam ao cache já atualizados
+        rounds = {session_round.round_number: session_round for session_round in session.round_list}
+        with transaction.atomic():
+            # UPDATE condicionado ao status lido: de duas requisições
+            # concorrentes, apenas uma vence; a outra recebe conflito
+            if self.changed_fields:
+                values = {field: getattr(session, field) for field in self.changed_fields}
+                updated = BreathingSession.objects.filter(
+                    pk=session.pk, status=self.original_status
+                ).update(**values)
+                if not updated:
+                    raise TransitionConflict('A sessão foi alterada por outra requisição')
+
+            if self.round_changes:
+                self._write_rounds(rounds)
+                session._set_round_cache(rounds.values())
+
+            if session.status == 'completed' and self.original_status != 'completed':
+                session.record_completion()
+            else:
+                invalidate_user_responses(session.user_id, RECENT)
+
+        self.original_status = session.status
+        self.changed_fields = set()
+        self.round_changes = {}
+        return session
+
+    def _write_rounds(self, rounds):
+        """Upsert dos rounds alterados; rounds (por número) é atualizado em memória"""
+        session = self.session
+        previous_holds = {number: session_round.hold_seconds for number, session_round in rounds.items()}
+
+        # Agrupar por conjunto de campos para um único upsert por grupo
+        groups = {}
+        for number, changes in self.round_changes.items():
+            groups.setdefault(tuple(sorted(changes)), []).append(
+                SessionRound(session=session, round_number=number, **changes)
+            )
+        for fields, changed in groups.items():
+            SessionRound.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['session', 'round_number'],
+                update_fields=list(fields),
+            )
+
+        for number, changes in self.round_changes.items():
+            session_round = rounds.setdefault(number, SessionRound(session=session, round_number=number))
+            for field, value in changes.items():
+                setattr(session_round, field, value)
+            if 'hold_seconds' in changes:
+                DailySessionRollup.record_hold(session, changes['hold_seconds'], previous_holds.get(number, 0))
+
+
+def transition(session, action, data=None):
+    """Aplica uma única ação e grava imediatamente"""
+    return SessionStateMachine(session).apply(action, data).commit()
+
+
+def apply_events(session, events):
+    """Aplica uma lista ordenada de eventos de fase em uma única transação"""
+    if len(events) > MAX_BATCH_EVENTS:
+        raise TransitionError(f'No máximo {MAX_BATCH_EVENTS} eventos por lote')
+
+    machine = SessionStateMachine(session)
+    for index, event in enumerate(events):
+        try:
+            machine.apply_event(event)
+        except TransitionError as error:
+            raise TransitionError(f'Evento {index + 1} ({event["action"]}): {error.message}')
+
+    return machine.commit()
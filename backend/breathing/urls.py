@@ -4,7 +4,12 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import (
     RegisterView, LoginView, UserProfileViewSet, FriendshipViewSet,
-    BreathingSessionViewSet, UserSearchView, HealthCheckView
+    BreathingSessionViewSet, UserSearchView, FeedView, LeaderboardView,
+    HealthCheckView, MetricsView
+)
+from .async_views import (
+    AsyncSessionStatsView, AsyncRecentSessionsView, AsyncActiveSessionView,
+    AsyncFriendsView, AsyncUserSearchView, AsyncHealthCheckView
 )
 
 # Router para ViewSets
@@ -22,8 +27,23 @@ urlpatterns = [
     # Busca de usuários
     path('users/search/', UserSearchView.as_view(), name='user_search'),
     
+    # Feed de atividades dos amigos
+    path('feed/', FeedView.as_view(), name='feed'),
+    
+    # Ranking entre amigos
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    
     # Health check
     path('health/', HealthCheckView.as_view(), name='health_check'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    
+    # Versões assíncronas das leituras mais frequentes (servidas via ASGI)
+    path('async/sessions/stats/', AsyncSessionStatsView.as_view(), name='async_session_stats'),
+    path('async/sessions/recent/', AsyncRecentSessionsView.as_view(), name='async_session_recent'),
+    path('async/sessions/active/', AsyncActiveSessionView.as_view(), name='async_session_active'),
+    path('async/friendships/friends/', AsyncFriendsView.as_view(), name='async_friends'),
+    path('async/users/search/', AsyncUserSearchView.as_view(), name='async_user_search'),
+    path('async/health/', AsyncHealthCheckView.as_view(), name='async_health_check'),
     
     # URLs dos ViewSets
     path('', include(router.urls)),
@@ -1,18 +1,45 @@
+import hmac
+import io
+
 from rest_framework import generics, viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 
-from .models import UserProfile, Friendship, BreathingSession, SessionStats
+from .models import (
+    UserProfile, Friendship, BreathingSession, SessionStats, DailySessionRollup, FeedEntry,
+    LeaderboardScore
+)
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserRegistrationSerializer,
     LoginSerializer, FriendshipSerializer, BreathingSessionSerializer,
     BreathingSessionCreateSerializer, BreathingSessionStatsSerializer,
-    SessionStatsSerializer
+    SessionStatsSerializer, DailySessionRollupSerializer, SessionEventBatchSerializer,
+    FeedEntrySerializer, UserSearchSerializer
+)
+from .authentication import BreathingRefreshToken
+from .throttling import LoginIPThrottle, LoginUsernameThrottle
+from .cache import (
+    RECENT, STATS, cache_metrics, cached_user_response, invalidate_user_responses
+)
+from .idempotency import idempotent
+from .metrics import render_prometheus
+from .pagination import (
+    FeedCursorPagination, FriendshipCursorPagination, OptInCursorPaginationMixin,
+    SessionCursorPagination
+)
+from .search import search_users
+from .transfer import (
+    CONTENT_TYPES, FORMATS, ImportRowError, chunked, export_rows, import_sessions, render_rows,
+    streaming_chunks
 )
+from .transitions import TransitionError, apply_events, transition
 
 
 class RegisterView(generics.CreateAPIView):
@@ -27,7 +54,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
         
         # Gerar tokens JWT
-        refresh = RefreshToken.for_user(user)
+        refresh = BreathingRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -41,6 +68,7 @@ class LoginView(generics.GenericAPIView):
     """View para login de usuários"""
     serializer_class = LoginSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -48,7 +76,7 @@ class LoginView(generics.GenericAPIView):
         user = serializer.validated_data['user']
         
         # Gerar tokens JWT
-        refresh = RefreshToken.for_user(user)
+        refresh = BreathingRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -62,10 +90,16 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     """ViewSet para perfis de usuário"""
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # O perfil é criado e serializado com o User completo
+    authentication_classes = [JWTAuthentication]
 
     def get_queryset(self):
         return UserProfile.objects.filter(user=self.request.user)
 
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_user_responses(self.request.user.id)
+
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Retorna o perfil do usuário atual"""
@@ -79,69 +113,91 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         profile, created = UserProfile.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.perform_update(serializer)
         return Response(serializer.data)
 
 
-class FriendshipViewSet(viewsets.ModelViewSet):
+def accepted_friendships(user_id):
+    """Amizades aceitas do usuário, com os dois usuários carregados"""
+    return Friendship.for_user(user_id).filter(status='accepted').select_related(
+        'requester', 'addressee'
+    ).order_by('-created_at')
+
+
+def serialize_friends(user_id, friendships):
+    """O outro usuário de cada amizade"""
+    return [
+        UserSerializer(
+            friendship.addressee if friendship.requester_id == user_id else friendship.requester
+        ).data
+        for friendship in friendships
+    ]
+
+
+class FriendshipViewSet(OptInCursorPaginationMixin, viewsets.ModelViewSet):
     """ViewSet para gerenciar amizades"""
     serializer_class = FriendshipSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_pagination_class = FriendshipCursorPagination
+
+    def list_response(self, queryset, to_representation):
+        """Lista completa, ou uma página por cursor com ?pagination=cursor"""
+        if self.use_cursor_pagination():
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(to_representation(page))
+        return Response(to_representation(queryset))
 
     def get_queryset(self):
-        user = self.request.user
-        return Friendship.objects.filter(
-            Q(requester=user) | Q(addressee=user)
+        # Sempre do banco: o grafo em cache pode estar defasado em outro processo
+        return Friendship.for_user(self.request.user.id).select_related(
+            'requester', 'addressee'
         ).order_by('-created_at')
 
+    def perform_destroy(self, instance):
+        previous_status = instance.status
+        instance.delete()
+        FeedEntry.sync_friendship(instance, previous_status)
+
     @action(detail=False, methods=['get'])
     def friends(self, request):
         """Lista amigos aceitos"""
-        user = request.user
-        friendships = Friendship.objects.filter(
-            (Q(requester=user) | Q(addressee=user)) & Q(status='accepted')
+        user_id = request.user.id
+        return self.list_response(
+            accepted_friendships(user_id),
+            lambda friendships: serialize_friends(user_id, friendships)
         )
-        
-        friends = []
-        for friendship in friendships:
-            friend = friendship.addressee if friendship.requester == user else friendship.requester
-            friends.append(UserSerializer(friend).data)
-        
-        return Response(friends)
 
     @action(detail=False, methods=['get'])
     def pending_requests(self, request):
         """Lista solicitações pendentes recebidas"""
         pending = Friendship.objects.filter(
-            addressee=request.user, 
-            status='pending'
-        )
-        serializer = self.get_serializer(pending, many=True)
-        return Response(serializer.data)
+            addressee_id=request.user.id, status='pending'
+        ).select_related('requester', 'addressee').order_by('-created_at')
+        return self.list_response(pending, lambda page: self.get_serializer(page, many=True).data)
 
     @action(detail=False, methods=['get'])
     def sent_requests(self, request):
         """Lista solicitações enviadas"""
         sent = Friendship.objects.filter(
-            requester=request.user, 
-            status='pending'
-        )
-        serializer = self.get_serializer(sent, many=True)
-        return Response(serializer.data)
+            requester_id=request.user.id, status='pending'
+        ).select_related('requester', 'addressee').order_by('-created_at')
+        return self.list_response(sent, lambda page: self.get_serializer(page, many=True).data)
 
     @action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
         """Aceitar solicitação de amizade"""
         friendship = self.get_object()
         
-        if friendship.addressee != request.user:
+        if friendship.addressee_id != request.user.id:
             return Response(
                 {'error': 'Você não pode aceitar esta solicitação'}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        previous_status = friendship.status
         friendship.status = 'accepted'
         friendship.save()
+        FeedEntry.sync_friendship(friendship, previous_status)
         
         serializer = self.get_serializer(friendship)
         return Response(serializer.data)
@@ -151,14 +207,16 @@ class FriendshipViewSet(viewsets.ModelViewSet):
         """Rejeitar solicitação de amizade"""
         friendship = self.get_object()
         
-        if friendship.addressee != request.user:
+        if friendship.addressee_id != request.user.id:
             return Response(
                 {'error': 'Você não pode rejeitar esta solicitação'}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        previous_status = friendship.status
         friendship.status = 'rejected'
         friendship.save()
+        FeedEntry.sync_friendship(friendship, previous_status)
         
         serializer = self.get_serializer(friendship)
         return Response(serializer.data)
@@ -175,19 +233,94 @@ class FriendshipViewSet(viewsets.ModelViewSet):
         )
 
 
-class BreathingSessionViewSet(viewsets.ModelViewSet):
+def session_queryset(user_id, fields=None):
+    """Sessões do usuário, carregando apenas as relações usadas pelos campos pedidos"""
+    queryset = BreathingSession.objects.filter(user_id=user_id).order_by('-started_at')
+    if fields is None:
+        return queryset.select_related('user', 'stats').prefetch_related('round_times')
+    related = {BreathingSessionSerializer.RELATED_FIELDS.get(name) for name in fields}
+    select = [name for name in ('user', 'stats') if name in related]
+    if select:
+        queryset = queryset.select_related(*select)
+    if 'round_times' in related:
+        queryset = queryset.prefetch_related('round_times')
+    return queryset
+
+
+def active_session(user_id, fields=None):
+    """Sessão em andamento mais recente do usuário (ou None)"""
+    return session_queryset(user_id, fields).filter(status='in_progress').first()
+
+
+def recent_sessions_data(user_id):
+    """Representação completa das últimas 10 sessões (cacheada)"""
+    return cached_user_response(
+        RECENT, user_id,
+        lambda: BreathingSessionSerializer(session_queryset(user_id)[:10], many=True).data
+    )
+
+
+def session_stats_data(user):
+    """Estatísticas resumidas do usuário (cacheadas)"""
+    return cached_user_response(
+        STATS, user.id,
+        lambda: BreathingSessionStatsSerializer(user).data
+    )
+
+
+class BreathingSessionViewSet(OptInCursorPaginationMixin, viewsets.ModelViewSet):
     """ViewSet para sessões de respiração"""
     permission_classes = [permissions.IsAuthenticated]
+    cursor_pagination_class = SessionCursorPagination
 
     def get_queryset(self):
-        return BreathingSession.objects.filter(user=self.request.user).order_by('-started_at')
+        return session_queryset(self.request.user.id, self.get_session_fields())
+
+    def get_session_fields(self):
+        """Campos pedidos via ?fields= ou ?view=summary (None = representação completa)"""
+        if self.action in ('create', 'update', 'partial_update'):
+            return None
+        return BreathingSessionSerializer.fields_from_request(self.request)
 
     def get_serializer_class(self):
         if self.action == 'create':
             return BreathingSessionCreateSerializer
         return BreathingSessionSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is BreathingSessionSerializer:
+            kwargs.setdefault('fields', self.get_session_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def session_response(self, session):
+        serializer = BreathingSessionSerializer(session, fields=self.get_session_fields())
+        return Response(serializer.data)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save()
+        invalidate_user_responses(self.request.user.id, RECENT)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        if 'hold_times' in serializer.validated_data:
+            # Retenções entram nas estatísticas além da lista de recentes
+            invalidate_user_responses(self.request.user.id)
+        else:
+            invalidate_user_responses(self.request.user.id, RECENT)
+
+    def perform_destroy(self, instance):
+        hold_seconds = [session_round.hold_seconds for session_round in instance.round_list]
+        with transaction.atomic():
+            instance.delete()
+            DailySessionRollup.record_removal(instance, hold_seconds)
+        invalidate_user_responses(instance.user_id)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def complete(self, request, pk=None):
         """Completar uma sessão de respiração"""
         session = self.get_object()
@@ -200,189 +333,265 @@ class BreathingSessionViewSet(viewsets.ModelViewSet):
         
         # Se já está completa, apenas retornar os dados
         if session.status == 'completed':
-            serializer = BreathingSessionSerializer(session)
-            return Response(serializer.data)
+            return self.session_response(session)
         
         # Completar a sessão se ainda não foi
         session.complete_session()
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
-
-    @action(detail=True, methods=['post'])
-    def cancel(self, request, pk=None):
-        """Cancelar uma sessão de respiração"""
-        session = self.get_object()
-        
-        if session.status != 'in_progress':
+        if session.status == 'cancelled':
             return Response(
-                {'error': 'Esta sessão já foi finalizada'}, 
+                {'error': 'Esta sessão foi cancelada'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session.status = 'cancelled'
-        session.save()
-        
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
+        return self.session_response(session)
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def cancel(self, request, pk=None):
+        """Cancelar uma sessão de respiração"""
+        return self._transition(request, 'cancel')
 
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Retorna a sessão ativa do usuário (se houver)"""
-        active_session = BreathingSession.objects.filter(
-            user=request.user, 
-            status='in_progress'
-        ).first()
+        session = active_session(request.user.id, self.get_session_fields())
         
-        if active_session:
-            serializer = BreathingSessionSerializer(active_session)
-            return Response(serializer.data)
+        if session:
+            return self.session_response(session)
         else:
             return Response({'message': 'Nenhuma sessão ativa'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Retorna estatísticas das sessões do usuário"""
-        serializer = BreathingSessionStatsSerializer(request.user)
-        return Response(serializer.data)
+        return Response(session_stats_data(request.user))
 
     @action(detail=False, methods=['get'])
-    def recent(self, request):
-        """Retorna as últimas 10 sessões do usuário"""
-        recent_sessions = self.get_queryset()[:10]
-        serializer = BreathingSessionSerializer(recent_sessions, many=True)
-        return Response(serializer.data)
-
-    @action(detail=True, methods=['post'])
-    def start_hold(self, request, pk=None):
-        """Iniciar fase de retenção (breath hold)"""
-        session = self.get_object()
-        
-        if session.status not in ['in_progress', 'breathing']:
+    def history(self, request):
+        """Retorna o histórico diário (resumos) dos últimos N dias"""
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
             return Response(
-                {'error': 'Sessão deve estar em progresso para iniciar retenção'}, 
+                {'error': 'days deve ser um número inteiro'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        session.status = 'holding'
-        session.save()
-        
-        serializer = BreathingSessionSerializer(session)
+        since = timezone.localdate() - timezone.timedelta(days=days - 1)
+        rollups = DailySessionRollup.objects.filter(user_id=request.user.id, day__gte=since)
+        serializer = DailySessionRollupSerializer(rollups, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post'])
-    def end_hold(self, request, pk=None):
-        """Finalizar fase de retenção e salvar tempo"""
-        session = self.get_object()
+    @action(detail=False, methods=['get'])
+    def recent(self, request):
+        """Retorna as últimas 10 sessões do usuário"""
+        fields = self.get_session_fields()
+        if fields is not None:
+            # Respostas parciais são baratas e não passam pelo cache
+            serializer = BreathingSessionSerializer(self.get_queryset()[:10], many=True, fields=fields)
+            return Response(serializer.data)
         
-        if session.status != 'holding':
+        return Response(recent_sessions_data(request.user.id))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exporta todo o histórico em streaming (?file_format=jsonl ou csv)"""
+        file_format = request.query_params.get('file_format', 'jsonl')
+        if file_format not in FORMATS:
             return Response(
-                {'error': 'Sessão deve estar em fase de retenção'}, 
+                {'error': 'file_format deve ser jsonl ou csv'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Obter dados do request
-        round_number = request.data.get('round_number')
-        hold_seconds = request.data.get('hold_seconds')
-        
-        if not round_number or hold_seconds is None:
+        rows = export_rows(BreathingSession.objects.filter(user_id=request.user.id))
+        chunks = streaming_chunks(chunked(render_rows(rows, file_format)))
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="sessoes.{file_format}"'
+        return response
+
+    @action(
+        detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser]
+    )
+    def import_history(self, request):
+        """Importa sessões de um arquivo jsonl ou csv enviado no campo file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Envie o arquivo no campo file'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or (
+            'csv' if upload.name.lower().endswith('.csv') else 'jsonl'
+        )
+        if file_format not in FORMATS:
             return Response(
-                {'error': 'round_number e hold_seconds são obrigatórios'}, 
+                {'error': 'file_format deve ser jsonl ou csv'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Salvar tempo de retenção
-        session.add_hold_time(round_number, hold_seconds)
-        session.status = 'recovery'
-        session.save()
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            imported, skipped = import_sessions(request.user.id, lines, file_format)
+        except ImportRowError as error:
+            return Response({'error': error.message}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'error': 'O arquivo deve estar em UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'imported': imported, 'skipped': skipped})
+
+    def _transition(self, request, action_name):
+        session = self.get_object()
+        try:
+            transition(session, action_name, request.data)
+        except TransitionError as error:
+            return Response({'error': error.message}, status=error.status_code)
         
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
+        return self.session_response(session)
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def start_hold(self, request, pk=None):
+        """Iniciar fase de retenção (breath hold)"""
+        return self._transition(request, 'start_hold')
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def end_hold(self, request, pk=None):
+        """Finalizar fase de retenção e salvar tempo"""
+        return self._transition(request, 'end_hold')
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def start_recovery(self, request, pk=None):
         """Iniciar fase de recuperação (breathing in)"""
-        session = self.get_object()
-        
-        if session.status != 'holding':
-            return Response(
-                {'error': 'Sessão deve estar em retenção para iniciar recuperação'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        session.status = 'recovery'
-        session.save()
-        
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
+        return self._transition(request, 'start_recovery')
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def end_recovery(self, request, pk=None):
         """Finalizar fase de recuperação"""
-        session = self.get_object()
-        
-        if session.status != 'recovery':
-            return Response(
-                {'error': 'Sessão deve estar em recuperação'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Obter dados do request
-        round_number = request.data.get('round_number')
-        recovery_seconds = request.data.get('recovery_seconds')
-        
-        if not round_number or recovery_seconds is None:
-            return Response(
-                {'error': 'round_number e recovery_seconds são obrigatórios'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Atualizar tempo de recuperação no round específico
-        if session.hold_times and len(session.hold_times) >= round_number:
-            session.hold_times[round_number - 1]['recovery'] = recovery_seconds
-            session.save()
-        
-        # Verificar se é o último round
-        if round_number >= session.rounds:
-            # Último round - manter status para permitir finalização manual
-            session.status = 'in_progress'
-        else:
-            session.status = 'in_progress'  # Próximo round
-        
-        session.save()
-        
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
+        return self._transition(request, 'end_recovery')
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def next_round(self, request, pk=None):
         """Ir para o próximo round"""
+        return self._transition(request, 'next_round')
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def events(self, request, pk=None):
+        """Aplicar em lote os eventos de fase registrados pelo cliente"""
         session = self.get_object()
+        serializer = SessionEventBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         
-        if session.status not in ['recovery', 'in_progress']:
-            return Response(
-                {'error': 'Status inválido para próximo round'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        session.status = 'breathing'  # Voltar para fase de respiração
-        session.save()
+        try:
+            apply_events(session, serializer.validated_data['events'])
+        except TransitionError as error:
+            return Response({'error': error.message}, status=error.status_code)
         
-        serializer = BreathingSessionSerializer(session)
-        return Response(serializer.data)
+        return self.session_response(session)
 
 
 class UserSearchView(generics.ListAPIView):
-    """View para buscar usuários por username"""
-    serializer_class = UserSerializer
+    """View para buscar usuários por username (prefixo e aproximada)"""
+    serializer_class = UserSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        users, self.relationships = search_users(
+            self.request.user, self.request.query_params.get('q', '')
+        )
+        return users
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['relationships'] = getattr(self, 'relationships', {})
+        return context
+
+
+class FeedView(generics.ListAPIView):
+    """Feed de atividades dos amigos (sessões concluídas), paginado por cursor"""
+    serializer_class = FeedEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        actor = request.query_params.get('actor')
+        if actor is not None and not actor.isdigit():
+            return Response(
+                {'error': 'actor deve ser o id de um usuário'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
-        query = self.request.query_params.get('q', '')
-        if query:
-            return User.objects.filter(
-                username__icontains=query
-            ).exclude(id=self.request.user.id)[:10]
-        return User.objects.none()
+        entries = FeedEntry.objects.filter(owner_id=self.request.user.id).select_related('actor')
+        # ?actor=<id>: apenas as sessões de um amigo
+        actor = self.request.query_params.get('actor')
+        if actor:
+            entries = entries.filter(actor_id=int(actor))
+        return entries
+
+
+class LeaderboardView(generics.GenericAPIView):
+    """Ranking entre amigos (semana atual ou geral) a partir das pontuações pré-calculadas"""
+    permission_classes = [permissions.IsAuthenticated]
+    METRICS = {
+        'breathing_time': 'breathing_time',
+        'sessions': 'session_count',
+        'best_hold': 'best_hold_seconds',
+    }
+
+    def get(self, request):
+        period_name = request.query_params.get('period', 'week')
+        metric = request.query_params.get('metric', 'breathing_time')
+        if period_name not in ('week', 'all'):
+            return Response(
+                {'error': 'period deve ser week ou all'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if metric not in self.METRICS:
+            return Response(
+                {'error': f'metric deve ser um de: {", ".join(self.METRICS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if period_name == 'all':
+            period = LeaderboardScore.ALL_TIME
+        else:
+            period = LeaderboardScore.week_period(timezone.localdate())
+
+        # Uma linha por participante, buscada pelo índice (period, user)
+        user_ids = set(Friendship.friend_ids(request.user.id)) | {request.user.id}
+        field = self.METRICS[metric]
+        values = {}
+        users = {}
+        for score in LeaderboardScore.objects.filter(
+            period=period, user_id__in=user_ids
+        ).select_related('user'):
+            value = getattr(score, field)
+            values[score.user_id] = int(value.total_seconds()) if metric == 'breathing_time' else value
+            users[score.user_id] = score.user
+        missing = user_ids - users.keys()
+        if missing:
+            users.update((user.id, user) for user in User.objects.filter(id__in=missing))
+
+        ranking = sorted(users.values(), key=lambda user: (-values.get(user.id, 0), user.username))
+        results = []
+        for position, user in enumerate(ranking, start=1):
+            value = values.get(user.id, 0)
+            # Empates dividem a mesma posição
+            rank = results[-1]['rank'] if results and results[-1]['value'] == value else position
+            results.append({
+                'rank': rank,
+                'user': UserSerializer(user).data,
+                'value': value,
+                'is_me': user.id == request.user.id,
+            })
+
+        return Response({
+            'period': period,
+            'metric': metric,
+            'results': results,
+        })
 
 
 class HealthCheckView(generics.GenericAPIView):
@@ -393,5 +602,27 @@ class HealthCheckView(generics.GenericAPIView):
         return Response({
             'status': 'ok',
             'timestamp': timezone.now(),
-            'message': 'Breathing App API está funcionando!'
-        })
\ No newline at end of file
+            'message': 'Breathing App API está funcionando!',
+            'cache': cache_metrics()
+        })
+
+
+class MetricsAccess(permissions.BasePermission):
+    """Usuários staff ou o coletor com o cabeçalho X-Metrics-Token = BREATHING_METRICS_TOKEN"""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'BREATHING_METRICS_TOKEN', None)
+        sent = request.headers.get('X-Metrics-Token')
+        if token and sent and hmac.compare_digest(sent.encode(), token.encode()):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(generics.GenericAPIView):
+    """Métricas por view deste processo no formato do Prometheus"""
+    # is_staff vem do banco: as claims do access token não o incluem
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [MetricsAccess]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
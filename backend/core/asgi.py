@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+# Inicializar o Django antes de importar código que usa os models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from breathing.routing import websocket_urlpatterns  # noqa: E402
+from breathing.transfer import serve_streams_async  # noqa: E402
+
+# Exportações em streaming com iterador assíncrono (ver BREATHING_ASYNC_STREAMING)
+serve_streams_async()
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Recusa conexões de origens fora de ALLOWED_HOSTS (páginas de terceiros)
+    'websocket': AllowedHostsOriginValidator(URLRouter(websocket_urlpatterns)),
+})
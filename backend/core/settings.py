@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +33,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -42,12 +45,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
+    'channels',
     
     # Local apps
     'breathing',
 ]
 
 MIDDLEWARE = [
+    'breathing.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +81,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
@@ -89,6 +95,22 @@ DATABASES = {
 }
 
 
+# Hash de senhas: o primeiro é usado para novas senhas; hashes dos demais
+# (como o PBKDF2 anterior) são refeitos com ele no próximo login.
+# Para Argon2, instale argon2-cffi e coloque Argon2PasswordHasher primeiro.
+PASSWORD_HASHERS = [
+    'breathing.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Custo do scrypt: ~110ms e 32MB por hash (N=2^15, r=8, p=1)
+BREATHING_SCRYPT_WORK_FACTOR = 2 ** 15
+BREATHING_SCRYPT_BLOCK_SIZE = 8
+BREATHING_SCRYPT_PARALLELISM = 1
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,22 +155,87 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'breathing.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_username': '10/min',
+    },
+}
+
+# Cache (respostas por usuário de /sessions/stats/ e /sessions/recent/ e
+# tamanhos das listas do índice de busca de usuários)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'breathing-app',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Respostas guardadas por Idempotency-Key (em produção com vários
+    # processos, usar um backend compartilhado como Redis)
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'breathing-idempotency',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
 }
 
+BREATHING_CACHE_ALIAS = 'default'
+BREATHING_CACHE_TIMEOUT = 300  # segundos
+
+# Idempotency-Key na criação e nas fases das sessões: respostas guardadas por
+# 24h e espera máxima (s) de uma requisição em andamento com a mesma chave
+BREATHING_IDEMPOTENCY_CACHE_ALIAS = 'idempotency'
+BREATHING_IDEMPOTENCY_TTL = 60 * 60 * 24
+BREATHING_IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+# Channels (WebSocket das sessões em tempo real)
+# Em produção com vários processos, usar channels_redis.core.RedisChannelLayer
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+BREATHING_WS_FLUSH_EVENTS = 20  # eventos acumulados antes de gravar no banco
+BREATHING_ASYNC_DB_THREADS = 16  # threads de leitura das views assíncronas
+
+# Métricas por view em /api/metrics/; queries mais lentas que este limite (ms)
+# são registradas no logger breathing.slow_queries (None desativa)
+BREATHING_SLOW_QUERY_MS = None
+# /api/metrics/ exige usuário staff ou o cabeçalho X-Metrics-Token com este valor (None: só staff)
+BREATHING_METRICS_TOKEN = None
+
+# Login: verificações de senha simultâneas, fila de espera e espera máxima (s)
+# A espera é curta de propósito: sem vaga, o login recebe 503 com Retry-After
+BREATHING_LOGIN_CONCURRENCY = 4
+BREATHING_LOGIN_QUEUE = 4
+BREATHING_LOGIN_QUEUE_TIMEOUT = 0.25
+
+# Sessões gravadas por lote na importação de histórico (/api/sessions/import/)
+BREATHING_IMPORT_BATCH_SIZE = 1000
+# Exportação em streaming: None segue o ponto de entrada (iterador assíncrono sob
+# core.asgi/daphne, síncrono sob core.wsgi); True ou False força um dos modos.
+# Com o modo errado o Django acumula a resposta inteira antes de enviá-la
+BREATHING_ASYNC_STREAMING = None
+
 # JWT Settings
 from datetime import timedelta
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    # Cada refresh token vale uma única vez (ver RefreshTokenRecord); os vencidos
+    # são apagados por manage.py prune_refresh_tokens
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_REFRESH_SERIALIZER': 'breathing.serializers.TokenRefreshSerializer',
+    # request.user das views é montado a partir das claims do access token
+    'TOKEN_USER_CLASS': 'breathing.authentication.BreathingTokenUser',
 }
 
 # CORS Settings
@@ -159,6 +246,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True  # Para desenvolvimento, remover em produção
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Internationalization
 LANGUAGE_CODE = 'pt-br'
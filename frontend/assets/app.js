@@ -121,10 +121,17 @@ class BreathingApp {
 
         document.getElementById('friend-search').addEventListener('keypress', (e) => {
             if (e.key === 'Enter') {
+                clearTimeout(this.searchTimer);
                 this.searchFriend();
             }
         });
 
+        // Busca enquanto digita, aguardando uma pausa na digitação
+        document.getElementById('friend-search').addEventListener('input', () => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.searchFriend(), 300);
+        });
+
         document.getElementById('close-modal').addEventListener('click', () => {
             this.closeModal();
         });
@@ -847,15 +854,16 @@ class BreathingApp {
             const stats = await statsResponse.json();
             console.log('📊 Stats recebidas:', stats);
             
-            console.log('🌐 Fazendo requisição para:', `${this.apiUrl}/sessions/`);
-            const sessionsResponse = await fetch(`${this.apiUrl}/sessions/`, { headers });
+            console.log('🌐 Fazendo requisição para:', `${this.apiUrl}/sessions/?pagination=cursor`);
+            const sessionsResponse = await fetch(`${this.apiUrl}/sessions/?pagination=cursor`, { headers });
             console.log('📋 Sessions response status:', sessionsResponse.status);
             
             if (!sessionsResponse.ok) {
                 throw new Error(`Sessions API error: ${sessionsResponse.status}`);
             }
             
-            const sessions = await sessionsResponse.json();
+            const sessionsPage = await sessionsResponse.json();
+            const sessions = sessionsPage.results || sessionsPage;
             console.log('📋 Sessões recebidas:', sessions.length, 'sessões');
             
             this.displayHistoryData(stats, sessions);
@@ -1168,11 +1176,21 @@ class BreathingApp {
 
     async searchFriend() {
         const searchTerm = document.getElementById('friend-search').value.trim();
-        if (!searchTerm) return;
+        if (searchTerm.length < 2) return;
+        
+        // Cancelar a busca anterior ainda em andamento
+        if (this.searchController) {
+            this.searchController.abort();
+        }
+        this.searchController = new AbortController();
         
         try {
-            const response = await fetch(`${this.apiUrl}/users/search/?q=${searchTerm}`);
-            const users = await response.json();
+            const response = await fetch(`${this.apiUrl}/users/search/?q=${encodeURIComponent(searchTerm)}`, {
+                headers: { 'Authorization': `Bearer ${this.authToken}` },
+                signal: this.searchController.signal
+            });
+            const data = await response.json();
+            const users = data.results || data;
             
             const resultsDiv = document.getElementById('search-results');
             resultsDiv.innerHTML = '';
@@ -1192,15 +1210,18 @@ class BreathingApp {
                         <div class="friend-stats">${user.first_name} ${user.last_name}</div>
                     </div>
                     <div class="friend-actions">
-                        <button class="friend-btn" onclick="breathingApp.sendFriendRequest('${user.username}')">
+                        ${user.relationship === 'friend' ? '<span>Amigo</span>'
+                            : user.relationship ? '<span>Pendente</span>'
+                            : `<button class="friend-btn" onclick="breathingApp.sendFriendRequest('${user.username}')">
                             Adicionar
-                        </button>
+                        </button>`}
                     </div>
                 `;
                 
                 resultsDiv.appendChild(userDiv);
             });
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.log('❌ Erro ao buscar usuários');
         }
     }
@@ -1249,9 +1270,15 @@ class BreathingApp {
 
     async viewFriendStats(friendName, friendId) {
         try {
-            // Carregar estatísticas do amigo
-            const response = await fetch(`${this.apiUrl}/sessions/?user=${friendId}`);
-            const friendSessions = await response.json();
+            // Sessões do amigo a partir do feed (uma única leitura indexada)
+            const response = await fetch(`${this.apiUrl}/feed/?actor=${friendId}&page_size=100`, {
+                headers: { 'Authorization': `Bearer ${this.authToken}` }
+            });
+            const feedPage = await response.json();
+            const friendSessions = feedPage.results.map(entry => ({
+                ...entry,
+                total_hold_time: entry.total_hold_seconds
+            }));
             
             this.showFriendStatsModal(friendName, friendSessions);
         } catch (error) {